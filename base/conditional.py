@@ -0,0 +1,62 @@
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Quoted ETag built from the values that identify a version of a page"""
+    return quote_etag(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest())
+
+
+def queryset_version(queryset):
+    """(row count, latest updated_at) of a queryset, in one aggregate query"""
+    version = queryset.order_by().aggregate(count=Count('pk'), latest=Max('updated_at'))
+    return version['count'], version['latest']
+
+
+def cache_version(key):
+    """Current value of a version counter kept in the cache, 0 until first bumped"""
+    return cache.get(key, 0)
+
+
+def bump_cache_version(key):
+    """Increment a cache version counter once the current transaction commits"""
+    def bump():
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:  # evicted between add() and incr()
+            cache.set(key, 1, None)
+    transaction.on_commit(bump)
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Answer a conditional GET before the expensive work of a view.
+
+    Returns a 304 response when the client's copy (If-None-Match, else
+    If-Modified-Since) is still current, otherwise None.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # A page with a pending flash message must render it, cached copy or not
+    if len(get_messages(request)):
+        return None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    """Attach ETag/Last-Modified so the client can revalidate next time"""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.notifications import archive_notifications
+
+
+class Command(BaseCommand):
+    help = 'Move notifications older than the retention period into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+            help='Keep notifications created within this many days')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of notifications to move per transaction')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        archived = 0
+        for moved in archive_notifications(before, options['batch_size']):
+            archived += moved
+            self.stdout.write(f'Archived {archived} notification(s)...')
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} notification(s) older than {options["days"]} days'))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_read_cursors(apps, schema_editor):
+    # The old global flag becomes everyone's starting position
+    Notification = apps.get_model('base', 'Notification')
+    NotificationReadCursor = apps.get_model('base', 'NotificationReadCursor')
+    User = apps.get_model('auth', 'User')
+    last_read_id = Notification.objects.filter(is_read=True).aggregate(latest=Max('id'))['latest']
+    if last_read_id:
+        NotificationReadCursor.objects.bulk_create(
+            [NotificationReadCursor(user_id=pk, last_read_id=last_read_id)
+             for pk in User.objects.values_list('pk', flat=True)],
+            batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('base', '0002_notification_created_by_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationReadCursor',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_cursor', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_read_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_read_cursors, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notification',
+            name='is_read',
+        ),
+    ]
@@ -24,12 +24,55 @@ class Notification(BaseModel):
     
     message = models.TextField()
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES, default='system')
-    is_read = models.BooleanField(default=False)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # Bursts of notifications sharing a group_key collapse into one summary row
+    group_key = models.CharField(max_length=100, blank=True)
+    group_count = models.PositiveIntegerField(default=1)
 
     class Meta:
         ordering = ['-created_at']  
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['group_key', 'created_at']),
+        ]
 
     def __str__(self):
-        return self.message[:50]
\ No newline at end of file
+        return self.message[:50]
+
+    def to_dict(self, last_read_id=0):
+        """JSON shape shared by the notifications API and stream, read state relative to a reader's cursor"""
+        return {
+            'id': self.id,
+            'message': self.message,
+            'created_at': self.created_at.strftime('%b %d, %H:%M'),
+            'is_read': self.id <= last_read_id,
+        }
+
+
+class NotificationReadCursor(models.Model):
+    """A user's read position: every notification with id <= last_read_id counts as read"""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='notification_cursor')
+    last_read_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.user} read up to {self.last_read_id}'
+
+
+class NotificationArchive(models.Model):
+    """Notifications moved out of the live table by the archive_notifications command"""
+    original_id = models.BigIntegerField(unique=True)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField()
+    group_count = models.PositiveIntegerField(default=1)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.message[:50]
@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive, NotificationReadCursor
+
+# Notification ids only grow, so a reader's unread count is a PK range
+# COUNT(id > last_read_id). Counts are cached per (cursor, latest id),
+# which every new notification moves past, so they never need deleting.
+UNREAD_CACHE_TIMEOUT = 60 * 60
+# Creating a notification clears the latest id; the short timeout covers
+# caches that aren't shared between processes
+LATEST_ID_TIMEOUT = 30
+SESSION_KEY = 'notifications_last_read_id'
+LATEST_ID_KEY = 'notifications:latest-id'
+
+
+def cursor_key(user_id):
+    return f'notifications:read-cursor:{user_id}'
+
+
+def latest_notification_id():
+    latest = cache.get(LATEST_ID_KEY)
+    if latest is None:
+        latest = Notification.objects.aggregate(latest=Max('id'))['latest'] or 0
+        cache.set(LATEST_ID_KEY, latest, LATEST_ID_TIMEOUT)
+    return latest
+
+
+def forget_latest_id():
+    """Called when a notification is created"""
+    cache.delete(LATEST_ID_KEY)
+
+
+def get_user_cursor(user_id):
+    last_read_id = cache.get(cursor_key(user_id))
+    if last_read_id is None:
+        last_read_id = NotificationReadCursor.objects.filter(user_id=user_id).values_list(
+            'last_read_id', flat=True).first() or 0
+        cache.set(cursor_key(user_id), last_read_id, UNREAD_CACHE_TIMEOUT)
+    return last_read_id
+
+
+def get_read_cursor(request):
+    """Id of the last notification the reader has seen; anonymous readers keep it in their session"""
+    if request.user.is_authenticated:
+        return get_user_cursor(request.user.pk)
+    return request.session.get(SESSION_KEY, 0)
+
+
+def unread_count(last_read_id):
+    latest = latest_notification_id()
+    if latest <= last_read_id:
+        return 0
+    key = f'notifications:unread:{last_read_id}:{latest}'
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(id__gt=last_read_id).count()
+        cache.set(key, count, UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def mark_read(request):
+    """Move the reader's cursor to the newest notification: one row upsert. Returns how many were unread"""
+    last_read_id = get_read_cursor(request)
+    latest = latest_notification_id()
+    if latest <= last_read_id:
+        return 0
+    marked = unread_count(last_read_id)
+    if request.user.is_authenticated:
+        NotificationReadCursor.objects.update_or_create(
+            user_id=request.user.pk, defaults={'last_read_id': latest})
+        cache.set(cursor_key(request.user.pk), latest, UNREAD_CACHE_TIMEOUT)
+    else:
+        request.session[SESSION_KEY] = latest
+    return marked
+
+
+BURST_WINDOW = timedelta(minutes=getattr(settings, 'NOTIFICATION_BURST_WINDOW_MINUTES', 30))
+
+
+def notify(message, notification_type='system', created_by=None, group_key='', burst_message=None):
+    """
+    Create a notification, collapsing bursts into one summary.
+
+    When notifications with the same group_key were created within
+    BURST_WINDOW, they are replaced by a single row whose message is
+    `burst_message` with `{count}` replaced by the total; other braces
+    (say, in a subject name) are left alone. The summary gets a new id
+    so readers who saw the earlier ones find it unread.
+    """
+    if not group_key or not burst_message:
+        return Notification.objects.create(
+            message=message, notification_type=notification_type, created_by=created_by)
+
+    with transaction.atomic():
+        since = timezone.now() - BURST_WINDOW
+        recent = Notification.objects.select_for_update().filter(group_key=group_key, created_at__gte=since)
+        previous = recent.aggregate(total=Sum('group_count'))['total'] or 0
+        if previous:
+            recent.delete()
+        count = previous + 1
+        return Notification.objects.create(
+            message=burst_message.replace('{count}', str(count)) if count > 1 else message,
+            notification_type=notification_type,
+            created_by=created_by,
+            group_key=group_key,
+            group_count=count,
+        )
+
+
+def archive_notifications(before, batch_size=1000):
+    """
+    Move notifications created before `before` into NotificationArchive,
+    oldest first, one bounded transaction per batch. Yields the size of each batch.
+    """
+    old = Notification.objects.filter(created_at__lt=before).order_by('created_at', 'id')
+    while True:
+        with transaction.atomic():
+            batch = list(old[:batch_size])
+            if not batch:
+                return
+            NotificationArchive.objects.bulk_create([
+                NotificationArchive(
+                    original_id=notification.id,
+                    message=notification.message,
+                    notification_type=notification.notification_type,
+                    created_by_id=notification.created_by_id,
+                    created_at=notification.created_at,
+                    group_count=notification.group_count,
+                ) for notification in batch
+            ], ignore_conflicts=True)
+            Notification.objects.filter(id__in=[notification.id for notification in batch]).delete()
+        yield len(batch)
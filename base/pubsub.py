@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class BaseBroker:
+    """
+    Interface for publishing messages to live subscribers.
+
+    `publish` may be called from any thread (views, signals); `subscribe`
+    is called from async code and returns a Subscription whose `get`
+    awaits the next message on the channel.
+    """
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        pass
+
+
+class Subscription:
+    def __init__(self, broker, channel, maxsize=100):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, message):
+        """Hand a message over from any thread; a subscriber that falls behind drops it"""
+        def put():
+            if not self.queue.full():
+                self.queue.put_nowait(message)
+        self.loop.call_soon_threadsafe(put)
+
+    async def get(self, timeout=None):
+        """Next message, or None after `timeout` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker(BaseBroker):
+    """
+    In-process fan-out to every subscriber in this process.
+
+    Only reaches clients connected to the same server process, so it
+    fits a single ASGI worker. Set NOTIFICATION_BROKER to a broker
+    backed by a shared service to run several.
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.deliver(message)
+            except RuntimeError:  # its event loop has closed
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.get(subscription.channel, set()).discard(subscription)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Broker from settings.NOTIFICATION_BROKER, in-process by default"""
+    return import_string(getattr(settings, 'NOTIFICATION_BROKER', 'base.pubsub.LocalBroker'))()
@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Notification
+from .notifications import forget_latest_id
+from .pubsub import get_broker
+
+NOTIFICATION_CHANNEL = 'notifications'
+
+
+@receiver(post_save, sender=Notification)
+def publish_notification(sender, instance, created, raw, **kwargs):
+    """Push new notifications to connected streams once they are committed"""
+    if not created or raw:
+        return
+
+    def publish():
+        forget_latest_id()
+        # Read state and unread count are per reader, filled in by each stream
+        get_broker().publish(NOTIFICATION_CHANNEL, instance.to_dict())
+    transaction.on_commit(publish)
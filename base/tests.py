@@ -1,3 +1,118 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from resource.models import ChunkedUpload
+from .models import Notification
+from .notifications import archive_notifications, notify
+from .pubsub import get_broker
+from .signals import NOTIFICATION_CHANNEL
+
+
+class NotifyBurstTests(TestCase):
+    def test_burst_message_keeps_braces_in_names(self):
+        burst = '📚 {count} new resources in Sets {A} & {B}'
+        notify('first', 'resource_upload', group_key='resource_upload:1', burst_message=burst)
+        notify('second', 'resource_upload', group_key='resource_upload:1', burst_message=burst)
+
+        summary = Notification.objects.get()
+        self.assertEqual(summary.message, '📚 2 new resources in Sets {A} & {B}')
+        self.assertEqual(summary.group_count, 2)
+
+
+class UploadViewTests(TestCase):
+    def test_staged_upload_without_a_known_type_is_rejected(self):
+        user = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(user)
+        for content_type in ('', 'text/plain'):
+            with self.subTest(content_type=content_type):
+                staged = ChunkedUpload.objects.create(
+                    created_by=user, filename='notes.bin', content_type=content_type, size=1, offset=1,
+                    completed_at=timezone.now())
+                response = self.client.post(reverse('upload_resource'), {'title': 'Notes', 'upload_id': staged.uid.hex})
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Invalid file type')
+
+
+class ReadCursorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('reader'))
+
+    def post(self, message):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(message=message)
+
+    def state(self):
+        data = self.client.get(reverse('get_latest_notifications')).json()
+        return data['unread_count'], {n['message']: n['is_read'] for n in data['notifications']}
+
+    def mark_read(self):
+        return self.client.post(reverse('mark_notifications_read')).json()['updated_count']
+
+    def test_cursor_tracks_unread(self):
+        self.post('one')
+        self.post('two')
+        self.assertEqual(self.state(), (2, {'one': False, 'two': False}))
+        self.assertEqual(self.mark_read(), 2)
+        self.assertEqual(self.state(), (0, {'one': True, 'two': True}))
+        self.assertEqual(self.mark_read(), 0)
+
+        self.post('three')
+        self.assertEqual(self.state(), (1, {'one': True, 'two': True, 'three': False}))
+
+    def test_archiving_keeps_read_items_read(self):
+        old = [self.post(f'old {i}') for i in range(2)]
+        self.post('recent')
+        self.mark_read()
+        Notification.objects.filter(pk__in=[n.pk for n in old]).update(created_at=timezone.now() - timedelta(days=100))
+
+        self.assertEqual(sum(archive_notifications(timezone.now() - timedelta(days=90))), 2)
+        self.assertEqual(self.state(), (0, {'recent': True}))
+        self.post('new')
+        self.assertEqual(self.state(), (1, {'recent': True, 'new': False}))
+
+
+class NotificationStreamTests(TestCase):
+    def subscriber_count(self):
+        return len(get_broker().subscribers.get(NOTIFICATION_CHANNEL, ()))
+
+    async def open_stream(self):
+        response = await self.async_client.get(reverse('notification_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        # The first chunk is sent once the stream has subscribed
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        return stream
+
+    async def test_published_notification_is_sent_as_an_event(self):
+        stream = await self.open_stream()
+        get_broker().publish(NOTIFICATION_CHANNEL, {'id': 7, 'message': 'New notes', 'is_read': False})
+        event = (await asyncio.wait_for(anext(stream), 5)).decode()
+        await stream.aclose()
+
+        head, data = event.rsplit('data: ', 1)
+        self.assertEqual(head, 'id: 7\nevent: notification\n')
+        self.assertTrue(data.endswith('\n\n'))
+        payload = json.loads(data)
+        self.assertEqual(payload['message'], 'New notes')
+        self.assertFalse(payload['is_read'])
+        self.assertIn('unread_count', payload)
 
-# Create your tests here.
+    async def test_disconnect_unsubscribes(self):
+        before = self.subscriber_count()
+        stream = await self.open_stream()
+        self.assertEqual(self.subscriber_count(), before + 1)
+        # A client disconnect cancels the task streaming the response
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(self.subscriber_count(), before)
@@ -5,16 +5,35 @@ from django.contrib.auth.models import User
 from resource.models import Cource,Subject,Session,Tag
 from base.models import Notification
 from .choices import RESOURCE_CATEGORY,RESOURCE_TYPE,SEMESTER_CHOICE
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from .pubsub import get_broker
+from .notifications import get_read_cursor, get_user_cursor, mark_read, notify, unread_count
+from resource.models import ChunkedUpload
+from resource.inspection import FORMATS
+from resource.uploads import ALLOWED_UPLOAD_TYPES, MAX_UPLOAD_SIZE, UnsupportedFile, attach_upload, inspect_upload
+from asgiref.sync import sync_to_async
+from .signals import NOTIFICATION_CHANNEL
+import asyncio
+import json
+import uuid
+
+# Streams end after this long and the browser reconnects, so connections recycle
+NOTIFICATION_STREAM_MAX_SECONDS = getattr(settings, 'NOTIFICATION_STREAM_MAX_SECONDS', 300)
+NOTIFICATION_STREAM_HEARTBEAT = 15
+NOTIFICATION_STREAM_RETRY_MS = 5000
 
 # Helper function to create notifications
-def create_notification(message, notification_type='system', created_by=None):
-    """Helper function to create a new notification"""
-    return Notification.objects.create(
-        message=message,
+def create_notification(message, notification_type='system', created_by=None, group_key='', burst_message=None):
+    """Helper function to create a new notification; see base.notifications.notify for bursts"""
+    return notify(
+        message,
         notification_type=notification_type,
-        created_by=created_by
+        created_by=created_by,
+        group_key=group_key,
+        burst_message=burst_message,
     )
 
 # Create your views here.
@@ -23,7 +42,6 @@ def home(request):
     subject = Subject.objects.all()
     session = Session.objects.all()
     notification = Notification.objects.order_by('-created_at')[:5]
-    unread_count = Notification.objects.filter(is_read=False).count()
     data = {
         'course':course,
         'subject':subject,
@@ -32,7 +50,7 @@ def home(request):
         'type':RESOURCE_TYPE,
         'semester':SEMESTER_CHOICE,
         'notifications':notification,
-        'unread_count':unread_count,
+        'unread_count':unread_count(get_read_cursor(request)),
     }
     return render(request, 'base/index.html',data)
 
@@ -40,7 +58,7 @@ def home(request):
 @csrf_exempt
 def mark_notifications_read(request):
     if request.method == "POST":
-        updated_count = Notification.objects.filter(is_read=False).update(is_read=True)
+        updated_count = mark_read(request)
         return JsonResponse({
             "status": "success", 
             "message": "Notifications marked as read",
@@ -51,23 +69,73 @@ def mark_notifications_read(request):
 def get_latest_notifications(request):
     """API endpoint to get latest notifications"""
     notifications = Notification.objects.order_by('-created_at')[:5]
-    unread_count = Notification.objects.filter(is_read=False).count()
+    last_read_id = get_read_cursor(request)
     
-    notifications_data = []
-    for notif in notifications:
-        notifications_data.append({
-            'id': notif.id,
-            'message': notif.message,
-            'created_at': notif.created_at.strftime('%b %d, %H:%M'),
-            'is_read': notif.is_read
-        })
+    notifications_data = [notif.to_dict(last_read_id) for notif in notifications]
     
     return JsonResponse({
         'status': 'success',
         'notifications': notifications_data,
-        'unread_count': unread_count
+        'unread_count': unread_count(last_read_id)
     })
 
+def sse_event(notification):
+    """Format a notification as a Server-Sent Event"""
+    return f"id: {notification['id']}\nevent: notification\ndata: {json.dumps(notification)}\n\n"
+
+
+async def notification_stream(request):
+    """Server-Sent Events stream pushing notifications as they are created"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker can't hold the connection open; 204 tells EventSource
+        # to stop reconnecting and the page falls back to polling
+        return HttpResponse(status=204)
+
+    last_id = request.headers.get('Last-Event-ID', '')
+    user = await request.auser()
+
+    async def read_state():
+        """(cursor, unread count) for this reader, re-read per event since another tab may mark read"""
+        if user.is_authenticated:
+            last_read_id = await sync_to_async(get_user_cursor)(user.pk)
+        else:
+            last_read_id = await sync_to_async(get_read_cursor)(request)
+        return last_read_id, await sync_to_async(unread_count)(last_read_id)
+
+    def with_read_state(notification, last_read_id, unread):
+        return {**notification, 'is_read': notification['id'] <= last_read_id, 'unread_count': unread}
+
+    async def events():
+        # Subscribe before catching up so nothing slips in between
+        subscription = get_broker().subscribe(NOTIFICATION_CHANNEL)
+        try:
+            yield f'retry: {NOTIFICATION_STREAM_RETRY_MS}\n\n'
+            if last_id.isdigit():
+                missed = [
+                    notif.to_dict() async for notif in
+                    Notification.objects.filter(id__gt=int(last_id)).order_by('id')[:20]
+                ]
+                if missed:
+                    last_read_id, unread = await read_state()
+                    for notification in missed:
+                        yield sse_event(with_read_state(notification, last_read_id, unread))
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + NOTIFICATION_STREAM_MAX_SECONDS
+            while (remaining := deadline - loop.time()) > 0:
+                message = await subscription.get(timeout=min(NOTIFICATION_STREAM_HEARTBEAT, remaining))
+                if message is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield sse_event(with_read_state(message, *await read_state()))
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
 # def create_test_notification(request):
 #     """Test endpoint to create a sample notification"""
 #     if request.user.is_authenticated and request.user.is_staff:
@@ -177,6 +245,8 @@ def upload_view(request):
         'category': RESOURCE_CATEGORY,
         'type': RESOURCE_TYPE,
         'semester':SEMESTER_CHOICE,
+        'max_upload_size': MAX_UPLOAD_SIZE,
+        'allowed_upload_types': ALLOWED_UPLOAD_TYPES,
     }
     
     if request.method == 'POST':
@@ -192,8 +262,20 @@ def upload_view(request):
         tags = request.POST.getlist('tags[]')
         semester = request.POST.get('semester')
         url = request.POST.get('url')
+        # A file sent through the chunked upload API arrives as its upload id
+        upload_id = request.POST.get('upload_id')
+        staged = None
+        if upload_id:
+            try:
+                staged = ChunkedUpload.objects.filter(
+                    uid=uuid.UUID(upload_id), created_by=request.user, completed_at__isnull=False).first()
+            except ValueError:
+                pass
+            if staged is None:
+                context['error_message'] = 'The uploaded file could not be found. Please upload it again.'
+                return render(request, 'base/upload.html', context)
         print(url,file)
-        if not file and not url:
+        if not file and not url and not staged:
             context['error_message'] = 'Please upload a file or enter a URL.'
             return render(request, 'base/upload.html', context)
         
@@ -202,13 +284,22 @@ def upload_view(request):
             context['error_message'] = 'File size exceeds the maximum limit of 10MB.'
             return render(request, 'base/upload.html', context)
         
-        # Validate file type
-        allowed_types = ['application/pdf', 'application/msword', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', 
-                        'application/vnd.ms-powerpoint', 'application/vnd.openxmlformats-officedocument.presentationml.presentation', 'application/zip']
-        
-        if file and file.content_type not in allowed_types:
-            context['error_message'] = 'Invalid file type. Please upload a supported format.'
-            return render(request, 'base/upload.html', context)
+        # Validate file type from its first bytes; the detected format sets Resource.type
+        if file:
+            try:
+                resource_type = inspect_upload(file, file.content_type).resource_type
+            except UnsupportedFile as e:
+                context['error_message'] = str(e)
+                return render(request, 'base/upload.html', context)
+        elif staged:
+            # Sniffed when its last chunk arrived
+            detected = FORMATS.get(staged.content_type)
+            if detected is None:
+                context['error_message'] = 'Invalid file type. Please upload a supported format.'
+                return render(request, 'base/upload.html', context)
+            resource_type = detected.resource_type
+        elif not resource_type:
+            resource_type = 'other'
         
         try:
             # Get related objects
@@ -234,6 +325,9 @@ def upload_view(request):
             )
             if file:
                 resource.file = file
+            elif staged:
+                # Moves the staging file into place rather than copying it
+                attach_upload(staged, resource)
             else:
                 resource.url = url
             resource.save()
@@ -260,7 +354,10 @@ def upload_view(request):
             create_notification(
                 notification_message,
                 notification_type='resource_upload',
-                created_by=request.user
+                created_by=request.user,
+                # Several uploads to one subject in a short while become one summary
+                group_key=f'resource_upload:{subject_obj.id}',
+                burst_message=f"📚 {{count}} new resources in {subject_obj.name}",
             )
             
             context['success_message'] = 'Resource uploaded successfully!'
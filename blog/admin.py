@@ -1,30 +1,24 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import BlogPost, Category, Tag, Comment
+from .comments import invalidate_comments
+from .counters import recount_comments
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'post_count', 'created_at']
+    list_display = ['name', 'slug', 'published_post_count', 'created_at']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
-    readonly_fields = ['created_at']
-
-    def post_count(self, obj):
-        return obj.posts.count()
-    post_count.short_description = 'Posts'
+    readonly_fields = ['created_at', 'published_post_count']
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'post_count', 'created_at']
+    list_display = ['name', 'slug', 'published_post_count', 'created_at']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name']
-    readonly_fields = ['created_at']
-
-    def post_count(self, obj):
-        return obj.posts.count()
-    post_count.short_description = 'Posts'
+    readonly_fields = ['created_at', 'published_post_count']
 
 
 @admin.register(BlogPost)
@@ -81,11 +75,18 @@ class CommentAdmin(admin.ModelAdmin):
     content_preview.short_description = 'Content Preview'
 
     def approve_comments(self, request, queryset):
+        post_ids = set(queryset.values_list('post_id', flat=True))
         queryset.update(is_approved=True)
+        # update() bypasses the comment signals, so recount the affected posts
+        recount_comments(post_ids)
+        invalidate_comments(*post_ids)
         self.message_user(request, f'{queryset.count()} comments approved.')
     approve_comments.short_description = 'Approve selected comments'
 
     def disapprove_comments(self, request, queryset):
+        post_ids = set(queryset.values_list('post_id', flat=True))
         queryset.update(is_approved=False)
+        recount_comments(post_ids)
+        invalidate_comments(*post_ids)
         self.message_user(request, f'{queryset.count()} comments disapproved.')
     disapprove_comments.short_description = 'Disapprove selected comments'
@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from resource.pagination import encode_cursor, decode_cursor
+
+COMMENTS_PAGE_SIZE = 20
+FIRST_PAGE_TIMEOUT = 60 * 60 * 24
+REPLIES_TIMEOUT = 60 * 60 * 24
+
+
+def first_page_key(post_id):
+    return f'blog:comments-first-page:{post_id}'
+
+
+def replies_key(post_id):
+    return f'blog:comment-replies:{post_id}'
+
+
+def build_comment_tree(comments):
+    """
+    Link a flat, created_at-ordered list of comments into a tree in one pass.
+
+    Each comment gets a `children` list. Returns {parent_id: children},
+    so the top-level comments of the list are under None. Comments whose
+    parent is not in the list (e.g. an unapproved reply) are reachable
+    only from that parent_id, so they drop out of every subtree above it.
+    """
+    children = defaultdict(list)
+    for comment in comments:
+        children[comment.parent_id].append(comment)
+    for comment in comments:
+        comment.children = children.get(comment.id, [])
+    return children
+
+
+def get_replies(post):
+    """A post's approved replies at every depth, loaded in one query and cached until a comment changes"""
+    key = replies_key(post.id)
+    replies = cache.get(key)
+    if replies is None:
+        # Cached flat: a linked tree may be too deep to pickle
+        replies = list(post.comments.filter(is_approved=True, parent__isnull=False)
+                       .select_related('author').order_by('created_at', 'id'))
+        cache.set(key, replies, REPLIES_TIMEOUT)
+    return replies
+
+
+def get_comment_page(post, parent_id=None, cursor=None, page_size=COMMENTS_PAGE_SIZE):
+    """
+    One page of a post's approved comments, oldest first.
+
+    With parent_id=None the page holds top-level threads, each annotated
+    with `reply_count` so its replies can be fetched on demand. Otherwise
+    it holds the direct replies to that comment with their whole subtrees
+    linked in as `children`, built from get_replies(). Pages are
+    keyset-paginated on (created_at, id). Returns (comments, next_cursor).
+    """
+    position = decode_cursor(cursor)[:2] if cursor else None
+    if parent_id is None:
+        comments = post.comments.filter(is_approved=True, parent_id=None).select_related('author').annotate(
+            reply_count=Count('replies', filter=Q(replies__is_approved=True))
+        ).order_by('created_at', 'id')
+        if position:
+            created_at, pk = position
+            comments = comments.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+        comments = list(comments[:page_size + 1])
+    else:
+        comments = build_comment_tree(get_replies(post)).get(parent_id, [])
+        if position:
+            comments = [c for c in comments if (c.created_at, c.id) > position]
+        comments = comments[:page_size + 1]
+
+    next_cursor = None
+    if len(comments) > page_size:
+        comments = comments[:page_size]
+        next_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
+    return comments, next_cursor
+
+
+def get_first_page(post):
+    """(first page of threads, next cursor), cached until a comment changes"""
+    key = first_page_key(post.id)
+    cached = cache.get(key)
+    if cached is None:
+        cached = get_comment_page(post)
+        cache.set(key, cached, FIRST_PAGE_TIMEOUT)
+    return cached
+
+
+def invalidate_comments(*post_ids):
+    """Drop the cached comment pages of posts once the current transaction commits"""
+    keys = [key for post_id in post_ids for key in (first_page_key(post_id), replies_key(post_id))]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,79 @@
+from django.apps import apps as global_apps
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def adjust_post_counters(category_id, author_id, tag_ids, delta):
+    """Add delta to the published post counters of a category, an author and tags"""
+    from .models import Category, Tag, AuthorStats
+
+    if category_id:
+        Category.objects.filter(pk=category_id).update(published_post_count=F('published_post_count') + delta)
+    if author_id:
+        AuthorStats.objects.get_or_create(author_id=author_id)
+        AuthorStats.objects.filter(author_id=author_id).update(published_post_count=F('published_post_count') + delta)
+    if tag_ids:
+        Tag.objects.filter(pk__in=tag_ids).update(published_post_count=F('published_post_count') + delta)
+
+
+# BlogPost fields that decide what a post contributes to the counters
+COUNTED_POST_FIELDS = {'status', 'category', 'author'}
+
+
+def post_counted_state(status, category_id, author_id):
+    """What a post contributes to the counters: (published?, category, author)"""
+    return (status == 'published', category_id, author_id)
+
+
+def move_post_counters(previous, current, tag_ids):
+    """
+    Apply a post's move between counted states (None for no row). `tag_ids`
+    are the post's tags, which only count while it is published.
+    """
+    was_published = bool(previous and previous[0])
+    is_published = bool(current and current[0])
+    if was_published:
+        adjust_post_counters(previous[1], previous[2], tag_ids if not is_published else [], -1)
+    if is_published:
+        adjust_post_counters(current[1], current[2], tag_ids if not was_published else [], 1)
+
+
+def adjust_comment_counter(post_id, delta):
+    from .models import BlogPost
+
+    BlogPost.objects.filter(pk=post_id).update(approved_comment_count=F('approved_comment_count') + delta)
+
+
+def _count(queryset, group_field):
+    """Subquery counting rows of queryset per OuterRef('pk'), 0 when there are none"""
+    counted = queryset.filter(**{group_field: OuterRef('pk')}).order_by().values(group_field).annotate(
+        n=Count('pk')).values('n')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+def recount_comments(post_ids=None, apps=global_apps):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    Comment = apps.get_model('blog', 'Comment')
+    posts = BlogPost.objects.all() if post_ids is None else BlogPost.objects.filter(pk__in=post_ids)
+    return posts.update(approved_comment_count=_count(Comment.objects.filter(is_approved=True), 'post'))
+
+
+def recount_all(apps=global_apps):
+    """Recompute every counter from scratch, repairing any drift"""
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    Category = apps.get_model('blog', 'Category')
+    Tag = apps.get_model('blog', 'Tag')
+    AuthorStats = apps.get_model('blog', 'AuthorStats')
+    User = apps.get_model('auth', 'User')
+
+    published = BlogPost.objects.filter(status='published')
+    Category.objects.update(published_post_count=_count(published, 'category'))
+    Tag.objects.update(published_post_count=_count(
+        BlogPost.tags.through.objects.filter(blogpost__status='published'), 'tag'))
+
+    author_ids = set(User.objects.filter(blog_posts__isnull=False).values_list('pk', flat=True))
+    existing = set(AuthorStats.objects.values_list('author_id', flat=True))
+    AuthorStats.objects.bulk_create([AuthorStats(author_id=pk) for pk in author_ids - existing])
+    AuthorStats.objects.update(published_post_count=_count(published, 'author'))
+
+    recount_comments(apps=apps)
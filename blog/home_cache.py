@@ -0,0 +1,98 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+HOME_CACHE_TIMEOUT = getattr(settings, 'BLOG_HOME_CACHE_TIMEOUT', 60 * 15)
+REBUILD_LOCK_TIMEOUT = 10
+REBUILD_WAIT = 2
+REBUILD_POLL_INTERVAL = 0.05
+
+# Which home page fragments depend on which models
+FRAGMENT_DEPENDENCIES = {
+    'BlogPost': ('featured_posts', 'recent_posts', 'categories'),
+    'Category': ('featured_posts', 'recent_posts', 'categories'),
+    'Tag': ('featured_posts', 'recent_posts', 'popular_tags'),
+}
+
+# Fragments that only move when a post is published, unpublished, deleted
+# while published or retagged, so plain edits leave them cached
+POST_TAG_FRAGMENTS = ('popular_tags',)
+
+
+def fragment_key(name):
+    return f'blog:home:{name}'
+
+
+def version_key(name):
+    return f'blog:home:{name}:version'
+
+
+def lock_key(name):
+    return f'blog:home:{name}:lock'
+
+
+def get_fragments(builders):
+    """
+    Evaluate the home page fragments, serving them from the cache.
+
+    `builders` maps a fragment name to a callable returning its value.
+    Entries are stored with the fragment's version number; invalidation
+    bumps the version instead of deleting the entry, so when it goes
+    stale exactly one worker (the one that wins the rebuild lock)
+    rebuilds it while the others keep serving the previous value.
+    """
+    keys = [fragment_key(name) for name in builders] + [version_key(name) for name in builders]
+    cached = cache.get_many(keys)
+    return {
+        name: _get_fragment(name, build, cached.get(version_key(name), 0), cached.get(fragment_key(name)))
+        for name, build in builders.items()
+    }
+
+
+def _get_fragment(name, build, version, entry):
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    if cache.add(lock_key(name), 1, REBUILD_LOCK_TIMEOUT):
+        try:
+            value = build()
+            cache.set(fragment_key(name), (version, value), HOME_CACHE_TIMEOUT)
+        finally:
+            cache.delete(lock_key(name))
+        return value
+
+    # Someone else is rebuilding: serve the stale value if there is one
+    if entry is not None:
+        return entry[1]
+
+    # Cold cache: wait briefly for the rebuild rather than piling onto the database
+    deadline = time.monotonic() + REBUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        entry = cache.get(fragment_key(name))
+        if entry is not None and entry[0] == version:
+            return entry[1]
+    return build()
+
+
+def invalidate(*names):
+    """Mark fragments stale once the current transaction commits"""
+    def bump():
+        for name in names:
+            key = version_key(name)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key)
+            except ValueError:  # evicted between add() and incr()
+                cache.set(key, 1, None)
+    transaction.on_commit(bump)
+
+
+def invalidate_for(model):
+    invalidate(*FRAGMENT_DEPENDENCIES.get(model.__name__, ()))
+
+
+def invalidate_post_tags():
+    invalidate(*POST_TAG_FRAGMENTS)
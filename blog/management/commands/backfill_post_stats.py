@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from blog.models import BlogPost
+from blog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Recompute plain text, word count and reading time for all blog posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of posts to write per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['plain_text', 'word_count', 'reading_minutes']
+        posts = BlogPost.objects.with_content().only('id', 'content').order_by('id')
+
+        batch = []
+        updated = 0
+        for post in posts.iterator(chunk_size=batch_size):
+            post.refresh_text_stats()
+            batch.append(post)
+            if len(batch) >= batch_size:
+                BlogPost.objects.bulk_update(batch, fields)
+                updated += len(batch)
+                batch = []
+        if batch:
+            BlogPost.objects.bulk_update(batch, fields)
+            updated += len(batch)
+
+        # bulk_update() skips BlogPost.save(), so refresh the search index in one pass
+        get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} post(s)'))
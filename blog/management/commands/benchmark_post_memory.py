@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from blog.models import BlogPost
+import time
+import tracemalloc
+
+
+class Command(BaseCommand):
+    help = 'Compare memory used by loading blog posts with and without the markdown body'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Only load this many posts (default: all)')
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        total = BlogPost.objects.count()
+        self.stdout.write(f'Loading {limit or total} of {total} post(s)')
+
+        querysets = [
+            ('summary (default)', BlogPost.objects.all()),
+            ('with_content()', BlogPost.objects.with_content()),
+        ]
+        for label, queryset in querysets:
+            if limit:
+                queryset = queryset[:limit]
+            peak, elapsed = self.measure(queryset)
+            self.stdout.write(f'{label:>18}: peak {peak / 1024:10.1f} KiB  {elapsed:7.3f}s')
+
+    def measure(self, queryset):
+        tracemalloc.start()
+        start = time.perf_counter()
+        posts = list(queryset)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del posts
+        return peak, elapsed
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from blog.related import RELATED_POSTS_COUNT, rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed related posts of every published post'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbors', type=int, default=RELATED_POSTS_COUNT,
+            help='Number of related posts to store per post')
+
+    def handle(self, *args, **options):
+        written = rebuild_related_posts(k=options['neighbors'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} related post link(s)'))
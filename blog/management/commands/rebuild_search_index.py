@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from blog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the blog full-text search index from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--merge', action='store_true',
+            help='Only fold pending incremental updates into the index (BM25 backend)')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if options['merge']:
+            if not hasattr(backend, 'merge'):
+                self.stdout.write(f'{type(backend).__name__} has nothing to merge')
+                return
+            backend.merge()
+            self.stdout.write(self.style.SUCCESS('Merged pending search index updates'))
+            return
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search index ({type(backend).__name__})'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blog.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized post and comment counters from scratch'
+
+    def handle(self, *args, **options):
+        recount_all()
+        self.stdout.write(self.style.SUCCESS('Blog counters recounted'))
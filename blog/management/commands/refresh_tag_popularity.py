@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from blog import home_cache
+from blog.popularity import refresh_tag_popularity
+
+
+class Command(BaseCommand):
+    help = 'Refresh the materialized tag popularity ranking (run periodically, e.g. from cron)'
+
+    def handle(self, *args, **options):
+        created, updated, deleted = refresh_tag_popularity()
+        if created or updated or deleted:
+            home_cache.invalidate('popular_tags')
+        self.stdout.write(self.style.SUCCESS(
+            f'Tag popularity: {created} added, {updated} updated, {deleted} removed'))
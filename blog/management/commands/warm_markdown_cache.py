@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from blog.models import BlogPost
+from blog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Render and store the HTML for published blog posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Re-render every post even if its cached HTML is current')
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of posts to write per query')
+
+    def handle(self, *args, **options):
+        posts = BlogPost.objects.published().with_content().only(
+            'id', 'content', 'content_html', 'content_hash').order_by('id')
+        fields = BlogPost.DERIVED_CONTENT_FIELDS
+
+        batch = []
+        rendered = 0
+        for post in posts.iterator(chunk_size=options['batch_size']):
+            if post.refresh_content_html(force=options['force']):
+                post.refresh_text_stats()
+                batch.append(post)
+            if len(batch) >= options['batch_size']:
+                BlogPost.objects.bulk_update(batch, fields)
+                rendered += len(batch)
+                batch = []
+        if batch:
+            BlogPost.objects.bulk_update(batch, fields)
+            rendered += len(batch)
+
+        # bulk_update() skips BlogPost.save(), so refresh the search index in one pass
+        if rendered:
+            get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} post(s)'))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:44
+
+import re
+
+from django.db import migrations
+
+# Frozen copies of blog.models.WORDS_PER_MINUTE and markdown_to_plain_text,
+# so later changes to the model module can't alter this migration
+WORDS_PER_MINUTE = 200
+
+
+def markdown_to_plain_text(content):
+    plain_text = re.sub(r'[#*`_~\[\]()]+', '', content)
+    plain_text = re.sub(r'!\[.*?\]\(.*?\)', '', plain_text)
+    plain_text = re.sub(r'\[.*?\]\(.*?\)', '', plain_text)
+    plain_text = re.sub(r'```.*?```', '', plain_text, flags=re.DOTALL)
+    plain_text = re.sub(r'`.*?`', '', plain_text)
+    plain_text = re.sub(r'\n+', ' ', plain_text)
+    return plain_text.strip()
+
+
+def backfill_text_stats(apps, schema_editor):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    batch = []
+    for post in BlogPost.objects.only('id', 'content').order_by('id').iterator(chunk_size=500):
+        post.plain_text = markdown_to_plain_text(post.content)
+        post.word_count = len(post.plain_text.split())
+        post.reading_minutes = max(1, post.word_count // WORDS_PER_MINUTE)
+        batch.append(post)
+        if len(batch) >= 500:
+            BlogPost.objects.bulk_update(batch, ['plain_text', 'word_count', 'reading_minutes'])
+            batch = []
+    if batch:
+        BlogPost.objects.bulk_update(batch, ['plain_text', 'word_count', 'reading_minutes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_blogpost_text_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_text_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:52
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX blog_blogpost_search_ft '
+            'ON blog_blogpost (title, excerpt, plain_text)')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE blog_blogpost_fts '
+            'USING fts5(title, excerpt, plain_text)')
+        schema_editor.execute(
+            'INSERT INTO blog_blogpost_fts (rowid, title, excerpt, plain_text) '
+            'SELECT id, title, excerpt, plain_text FROM blog_blogpost')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute('DROP INDEX blog_blogpost_search_ft ON blog_blogpost')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS blog_blogpost_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_backfill_blogpost_text_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
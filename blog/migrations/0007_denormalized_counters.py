@@ -0,0 +1,68 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, group_field):
+    counted = queryset.filter(**{group_field: OuterRef('pk')}).order_by().values(group_field).annotate(
+        n=Count('pk')).values('n')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+def backfill_counters(apps, schema_editor):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    Category = apps.get_model('blog', 'Category')
+    Tag = apps.get_model('blog', 'Tag')
+    Comment = apps.get_model('blog', 'Comment')
+    AuthorStats = apps.get_model('blog', 'AuthorStats')
+
+    published = BlogPost.objects.filter(status='published')
+    Category.objects.update(published_post_count=_count(published, 'category'))
+    Tag.objects.update(published_post_count=_count(
+        BlogPost.tags.through.objects.filter(blogpost__status='published'), 'tag'))
+    BlogPost.objects.update(approved_comment_count=_count(Comment.objects.filter(is_approved=True), 'post'))
+
+    author_ids = set(BlogPost.objects.values_list('author_id', flat=True).distinct())
+    AuthorStats.objects.bulk_create([AuthorStats(author_id=pk) for pk in author_ids])
+    AuthorStats.objects.update(published_post_count=_count(published, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('blog', '0006_blogpost_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='blog_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('published_post_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Author stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='blogpost',
+            name='approved_comment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='published_post_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='published_post_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
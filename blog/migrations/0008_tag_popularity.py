@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:53
+
+import math
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_tag_popularity(apps, schema_editor):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    TagPopularity = apps.get_model('blog', 'TagPopularity')
+    post_weight = getattr(settings, 'BLOG_TAG_POPULARITY_POST_WEIGHT', 1.0)
+    view_weight = getattr(settings, 'BLOG_TAG_POPULARITY_VIEW_WEIGHT', 0.5)
+
+    rows = BlogPost.tags.through.objects.filter(blogpost__status='published').order_by().values(
+        'tag_id').annotate(post_count=Count('blogpost_id'), total_views=Sum('blogpost__views_count'))
+    TagPopularity.objects.bulk_create([
+        TagPopularity(
+            tag_id=row['tag_id'], post_count=row['post_count'], total_views=row['total_views'] or 0,
+            score=row['post_count'] * post_weight + math.log1p(row['total_views'] or 0) * view_weight)
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagPopularity',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='blog.tag')),
+                ('post_count', models.IntegerField(default=0)),
+                ('total_views', models.BigIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Tag popularity',
+                'indexes': [models.Index(fields=['-score'], name='blog_tagpop_score_952a19_idx')],
+            },
+        ),
+        migrations.RunPython(populate_tag_popularity, migrations.RunPython.noop),
+    ]
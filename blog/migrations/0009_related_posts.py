@@ -0,0 +1,91 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:54
+
+import heapq
+import math
+from bisect import bisect_left
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+# Frozen copy of the blog.related scoring at the time of this migration
+RELATED_POSTS_COUNT = getattr(settings, 'BLOG_RELATED_POSTS_COUNT', 6)
+TAG_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.5
+RECENCY_WEIGHT = 0.5
+RECENCY_DAYS = 90
+
+
+def build_related_posts(apps, schema_editor):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    RelatedPost = apps.get_model('blog', 'RelatedPost')
+    k = RELATED_POSTS_COUNT
+
+    posts, category_timeline = {}, defaultdict(list)
+    published = BlogPost.objects.filter(status='published').annotate(
+        published=Coalesce('published_at', 'created_at'))
+    for post_id, category_id, published_at in published.values_list(
+            'id', 'category_id', 'published').iterator(chunk_size=2000):
+        posts[post_id] = (category_id, published_at.timestamp())
+        if category_id is not None:
+            category_timeline[category_id].append((published_at.timestamp(), post_id))
+    for timeline in category_timeline.values():
+        timeline.sort()
+
+    post_tags, tag_posts = defaultdict(list), defaultdict(list)
+    for post_id, tag_id in BlogPost.tags.through.objects.filter(blogpost__status='published').values_list(
+            'blogpost_id', 'tag_id').iterator(chunk_size=2000):
+        post_tags[post_id].append(tag_id)
+        tag_posts[tag_id].append(post_id)
+    idf = {tag_id: math.log(1 + len(posts) / max(len(ids), 1)) for tag_id, ids in tag_posts.items()}
+
+    rows = []
+    for post_id, (category_id, timestamp) in posts.items():
+        shared = defaultdict(float)
+        for tag_id in post_tags[post_id]:
+            for candidate in tag_posts[tag_id]:
+                shared[candidate] += idf[tag_id]
+        if category_id is not None:
+            timeline = category_timeline[category_id]
+            position = bisect_left(timeline, (timestamp, post_id))
+            for _, candidate in timeline[max(0, position - k):position + k + 1]:
+                shared.setdefault(candidate, 0.0)
+        shared.pop(post_id, None)
+
+        scored = []
+        for candidate, shared_idf in shared.items():
+            candidate_category, candidate_timestamp = posts[candidate]
+            same_category = category_id is not None and candidate_category == category_id
+            days = abs(timestamp - candidate_timestamp) / 86400
+            scored.append((TAG_WEIGHT * shared_idf + CATEGORY_WEIGHT * same_category
+                           + RECENCY_WEIGHT * math.exp(-days / RECENCY_DAYS), candidate))
+        rows.extend(
+            RelatedPost(post_id=post_id, related_id=candidate, score=score, rank=rank)
+            for rank, (score, candidate) in enumerate(heapq.nlargest(k, scored)))
+    RelatedPost.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_tag_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbor_entries', to='blog.blogpost')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='blog.blogpost')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('post', 'rank'), name='unique_related_post_rank')],
+            },
+        ),
+        migrations.RunPython(build_related_posts, migrations.RunPython.noop),
+    ]
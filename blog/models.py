@@ -1,11 +1,51 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils import timezone
 from markdownx.models import MarkdownxField
 from markdownx.utils import markdownify
+import hashlib
 import re
+from .counters import COUNTED_POST_FIELDS, move_post_counters, post_counted_state
+from .search import get_search_backend
+from base.conditional import bump_cache_version
+
+
+WORDS_PER_MINUTE = 200
+
+# Fields that feed the search index; status decides whether a post is searchable at all
+SEARCH_FIELDS = {'title', 'excerpt', 'content', 'plain_text', 'status'}
+
+# Cache version folded into the post and listing ETags, bumped by changes those
+# pages show that don't touch a post's updated_at: tags, names, counters, related posts
+LIST_VERSION_KEY = 'blog:list-version'
+
+
+def markdown_to_plain_text(content):
+    """Extract plain text from markdown content"""
+    # Remove markdown syntax
+    plain_text = re.sub(r'[#*`_~\[\]()]+', '', content)
+    plain_text = re.sub(r'!\[.*?\]\(.*?\)', '', plain_text)  # Remove images
+    plain_text = re.sub(r'\[.*?\]\(.*?\)', '', plain_text)   # Remove links
+    plain_text = re.sub(r'```.*?```', '', plain_text, flags=re.DOTALL)  # Remove code blocks
+    plain_text = re.sub(r'`.*?`', '', plain_text)  # Remove inline code
+    plain_text = re.sub(r'\n+', ' ', plain_text)  # Replace newlines with spaces
+    return plain_text.strip()
+
+
+def exclude_counters(instance, kwargs, counter_fields):
+    """
+    Leave database-maintained counters out of a full save() of an existing
+    row, so an instance loaded before an F() update can't write back a stale value.
+    """
+    if kwargs.get('update_fields') is not None or kwargs.get('force_insert') or instance._state.adding:
+        return
+    skipped = set(counter_fields) | instance.get_deferred_fields()
+    kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.attname not in skipped
+    ]
 
 
 class Category(models.Model):
@@ -13,6 +53,8 @@ class Category(models.Model):
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained by blog.signals, repaired by the recount_blog_counters command
+    published_post_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -24,6 +66,7 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        exclude_counters(self, kwargs, ['published_post_count'])
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
@@ -34,6 +77,7 @@ class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(max_length=50, unique=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    published_post_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['name']
@@ -44,12 +88,89 @@ class Tag(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        exclude_counters(self, kwargs, ['published_post_count'])
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('blog:tag_posts', kwargs={'slug': self.slug})
 
 
+class BlogPostQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """
+        Bulk updates send no signals, so do here what the BlogPost receivers
+        would: move the counters, refresh related posts and the home page
+        for posts whose counted state changes, and reindex the rows whose
+        searchable fields change.
+        """
+        fields = {name[:-3] if name.endswith('_id') else name for name in kwargs}
+        counted = not COUNTED_POST_FIELDS.isdisjoint(fields)
+        if not counted and SEARCH_FIELDS.isdisjoint(fields):
+            return super().update(**kwargs)
+        with transaction.atomic():
+            before = {pk: post_counted_state(*state) for pk, *state in
+                      self.values_list('pk', 'status', 'category_id', 'author_id')}
+            rows = super().update(**kwargs)
+            if counted:
+                self._apply_counted_changes(before)
+            if not SEARCH_FIELDS.isdisjoint(fields):
+                backend = get_search_backend()
+                for post in self.model._base_manager.filter(pk__in=before).iterator():
+                    backend.update_post(post)
+        return rows
+
+    def _apply_counted_changes(self, before):
+        from . import home_cache
+        from .related import schedule_update
+
+        after = {pk: post_counted_state(*state) for pk, *state in self.model._base_manager.filter(
+            pk__in=before).values_list('pk', 'status', 'category_id', 'author_id')}
+        changed = [pk for pk in before if before[pk] != after.get(pk)]
+        if not changed:
+            return
+        tag_ids, republished = {}, False
+        for post_id, tag_id in self.model.tags.through.objects.filter(
+                blogpost_id__in=changed).values_list('blogpost_id', 'tag_id'):
+            tag_ids.setdefault(post_id, []).append(tag_id)
+        for pk in changed:
+            previous, current = before[pk], after.get(pk)
+            # Tags only move when the post is published or unpublished
+            moved = previous[0] != bool(current and current[0])
+            republished = republished or moved
+            move_post_counters(previous, current, tag_ids.get(pk, []) if moved else [])
+        schedule_update(*[pk for pk in changed if before[pk][:2] != after[pk][:2]
+                          and (before[pk][0] or after[pk][0])])
+        home_cache.invalidate_for(self.model)
+        if republished:
+            home_cache.invalidate_post_tags()
+        bump_cache_version(LIST_VERSION_KEY)
+
+    def published(self):
+        return self.filter(status='published')
+
+    def with_content(self):
+        """Opt back in to loading the markdown body and its derived fields"""
+        return self.defer(None)
+
+    def for_listing(self):
+        """Load everything a post card renders: author, category and tags"""
+        return self.select_related('author', 'category').prefetch_related(
+            models.Prefetch('tags', queryset=Tag.objects.only('id', 'name', 'slug'))
+        )
+
+
+class BlogPostManager(models.Manager.from_queryset(BlogPostQuerySet)):
+    """
+    Summary projection: the markdown body and its derived copies are only
+    needed when a post is rendered or edited, so they are deferred unless
+    a query calls with_content().
+    """
+    body_fields = ['content', 'content_html', 'plain_text']
+
+    def get_queryset(self):
+        return super().get_queryset().defer(*self.body_fields)
+
+
 class BlogPost(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
@@ -66,6 +187,13 @@ class BlogPost(models.Model):
     tags = models.ManyToManyField(Tag, blank=True, related_name='posts')
 
     content = MarkdownxField(help_text="Write your blog content in Markdown format")
+    # Rendered HTML for `content`, refreshed in save() whenever content_hash changes
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    # Text stats derived from `content` at save time so listings do no regex work
+    plain_text = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_minutes = models.PositiveIntegerField(default=1, editable=False)
     excerpt = models.TextField(
         max_length=300, blank=True, help_text="Brief description of the post")
     featured_image = models.ImageField(
@@ -81,11 +209,19 @@ class BlogPost(models.Model):
         max_length=160, blank=True, help_text="SEO description")
 
     views_count = models.PositiveIntegerField(default=0)
+    approved_comment_count = models.IntegerField(default=0, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(null=True, blank=True)
 
+    objects = BlogPostManager()
+
+    DERIVED_CONTENT_FIELDS = [
+        'content_html', 'content_hash', 'plain_text', 'word_count', 'reading_minutes']
+    # Written only through F() updates (view buffer, comment signals)
+    COUNTER_FIELDS = ['views_count', 'approved_comment_count']
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -98,6 +234,7 @@ class BlogPost(models.Model):
         return self.title
 
     def save(self, *args, **kwargs):
+        exclude_counters(self, kwargs, self.COUNTER_FIELDS)
         if not self.slug:
             self.slug = slugify(self.title)
 
@@ -109,7 +246,17 @@ class BlogPost(models.Model):
         if not self.excerpt and self.content:
             self.excerpt = self.get_excerpt_from_content()
 
-        super().save(*args, **kwargs)
+        # Re-render the cached HTML and text stats only when the markdown has changed
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            if self.refresh_content_html():
+                self.refresh_text_stats()
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, *self.DERIVED_CONTENT_FIELDS}
+
+        # Counter and search index signals run inside the same transaction as the write
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
@@ -122,26 +269,36 @@ class BlogPost(models.Model):
 
     @property
     def reading_time(self):
-        """Calculate estimated reading time in minutes"""
-        # Remove markdown syntax for accurate word count
-        plain_text = self.get_plain_text_content()
-        word_count = len(plain_text.split())
-        return max(1, word_count // 200)  # Assuming 200 words per minute
+        """Estimated reading time in minutes, precomputed in save()"""
+        return self.reading_minutes
+
+    def get_content_hash(self):
+        return hashlib.sha256(self.content.encode()).hexdigest()
+
+    def refresh_content_html(self, force=False):
+        """Render content into content_html if it is stale. Returns True if re-rendered"""
+        content_hash = self.get_content_hash()
+        if not force and self.content_html and content_hash == self.content_hash:
+            return False
+        self.content_html = markdownify(self.content)
+        self.content_hash = content_hash
+        return True
+
+    def refresh_text_stats(self):
+        """Recompute plain_text, word_count and reading_minutes from content"""
+        self.plain_text = markdown_to_plain_text(self.content)
+        self.word_count = len(self.plain_text.split())
+        self.reading_minutes = max(1, self.word_count // WORDS_PER_MINUTE)
 
     def get_markdown_content(self):
-        """Convert markdown content to HTML"""
+        """Convert markdown content to HTML, using the cached render when current"""
+        if self.content_html and self.content_hash == self.get_content_hash():
+            return self.content_html
         return markdownify(self.content)
 
     def get_plain_text_content(self):
         """Extract plain text from markdown content"""
-        # Remove markdown syntax
-        plain_text = re.sub(r'[#*`_~\[\]()]+', '', self.content)
-        plain_text = re.sub(r'!\[.*?\]\(.*?\)', '', plain_text)  # Remove images
-        plain_text = re.sub(r'\[.*?\]\(.*?\)', '', plain_text)   # Remove links
-        plain_text = re.sub(r'```.*?```', '', plain_text, flags=re.DOTALL)  # Remove code blocks
-        plain_text = re.sub(r'`.*?`', '', plain_text)  # Remove inline code
-        plain_text = re.sub(r'\n+', ' ', plain_text)  # Replace newlines with spaces
-        return plain_text.strip()
+        return markdown_to_plain_text(self.content)
 
     def get_excerpt_from_content(self):
         """Generate excerpt from markdown content"""
@@ -151,6 +308,54 @@ class BlogPost(models.Model):
         return plain_text
 
 
+class RelatedPost(models.Model):
+    """Precomputed top-k neighbors of a published post, maintained by blog.related"""
+    post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='neighbor_entries')
+    related = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='related_entries')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'rank'], name='unique_related_post_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} -> {self.related_id} ({self.score:.2f})'
+
+
+class TagPopularity(models.Model):
+    """Materialized tag ranking, refreshed by the refresh_tag_popularity command"""
+    tag = models.OneToOneField(
+        Tag, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    post_count = models.IntegerField(default=0)
+    total_views = models.BigIntegerField(default=0)
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Tag popularity"
+        indexes = [
+            models.Index(fields=['-score']),
+        ]
+
+    def __str__(self):
+        return f'{self.tag} ({self.score:.2f})'
+
+
+class AuthorStats(models.Model):
+    """Per-author blog counters, kept apart since auth.User can't take extra columns"""
+    author = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='blog_stats')
+    published_post_count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Author stats"
+
+    def __str__(self):
+        return f'Stats for {self.author}'
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         BlogPost, on_delete=models.CASCADE, related_name='comments')
@@ -169,6 +374,11 @@ class Comment(models.Model):
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.title}'
 
+    def save(self, *args, **kwargs):
+        # Counter signals run inside the same transaction as the write
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     @property
     def is_reply(self):
         return self.parent is not None
@@ -0,0 +1,64 @@
+import math
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+# score = post_count * POST_WEIGHT + log(1 + total views) * VIEW_WEIGHT
+# Views are log-damped so a single viral post can't outrank a well-used tag
+POST_WEIGHT = getattr(settings, 'BLOG_TAG_POPULARITY_POST_WEIGHT', 1.0)
+VIEW_WEIGHT = getattr(settings, 'BLOG_TAG_POPULARITY_VIEW_WEIGHT', 0.5)
+
+
+def popularity_score(post_count, total_views):
+    return post_count * POST_WEIGHT + math.log1p(total_views) * VIEW_WEIGHT
+
+
+def refresh_tag_popularity(apps=global_apps):
+    """
+    Bring the TagPopularity table in line with the published posts.
+
+    The ranking inputs are aggregated for every tag in one GROUP BY over
+    the post/tag through table, then only rows whose numbers changed are
+    written. Returns (created, updated, deleted).
+    """
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    TagPopularity = apps.get_model('blog', 'TagPopularity')
+
+    current = {
+        row['tag_id']: (row['post_count'], row['total_views'] or 0)
+        for row in BlogPost.tags.through.objects.filter(blogpost__status='published').order_by().values(
+            'tag_id').annotate(post_count=Count('blogpost_id'), total_views=Sum('blogpost__views_count'))
+    }
+    existing = {row.tag_id: row for row in TagPopularity.objects.all()}
+
+    now = timezone.now()
+    created, changed = [], []
+    for tag_id, (post_count, total_views) in current.items():
+        row = existing.get(tag_id)
+        if row is None:
+            created.append(TagPopularity(
+                tag_id=tag_id, post_count=post_count, total_views=total_views,
+                score=popularity_score(post_count, total_views)))
+        elif (row.post_count, row.total_views) != (post_count, total_views):
+            row.post_count, row.total_views = post_count, total_views
+            row.score = popularity_score(post_count, total_views)
+            row.updated_at = now
+            changed.append(row)
+    stale = [tag_id for tag_id in existing if tag_id not in current]
+
+    with transaction.atomic():
+        TagPopularity.objects.bulk_create(created, batch_size=500)
+        TagPopularity.objects.bulk_update(
+            changed, ['post_count', 'total_views', 'score', 'updated_at'], batch_size=500)
+        TagPopularity.objects.filter(tag_id__in=stale).delete()
+    return len(created), len(changed), len(stale)
+
+
+def popular_tags(limit=15):
+    """Top tags by score: one query walking the score index"""
+    Tag = global_apps.get_model('blog', 'Tag')
+    return Tag.objects.filter(popularity__isnull=False).select_related(
+        'popularity').order_by('-popularity__score')[:limit]
@@ -0,0 +1,204 @@
+import heapq
+import math
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Coalesce
+
+from base.conditional import bump_cache_version
+from .models import LIST_VERSION_KEY
+
+# Number of neighbors stored per post
+RELATED_POSTS_COUNT = getattr(settings, 'BLOG_RELATED_POSTS_COUNT', 6)
+
+# score = TAG_WEIGHT * sum(idf of shared tags) + CATEGORY_WEIGHT * same category
+#         + RECENCY_WEIGHT * exp(-days between the posts / RECENCY_DAYS)
+# Every term is symmetric, so score(a, b) == score(b, a)
+TAG_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.5
+RECENCY_WEIGHT = 0.5
+RECENCY_DAYS = 90
+
+
+def related_score(shared_idf, same_category, seconds_apart):
+    days = abs(seconds_apart) / 86400
+    return (TAG_WEIGHT * shared_idf + CATEGORY_WEIGHT * same_category
+            + RECENCY_WEIGHT * math.exp(-days / RECENCY_DAYS))
+
+
+def tag_idf(post_count, document_frequency):
+    return math.log(1 + post_count / max(document_frequency, 1))
+
+
+def _published(apps):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    return BlogPost.objects.filter(status='published').annotate(
+        published=Coalesce('published_at', 'created_at'))
+
+
+def _category_window(timeline, timestamp, post_id, k):
+    """The k posts on either side of `timestamp` in a category's sorted (timestamp, id) list"""
+    position = bisect_left(timeline, (timestamp, post_id))
+    return [candidate for _, candidate in timeline[max(0, position - k):position + k + 1]]
+
+
+def _score_candidates(post_id, post, tags, posts, tag_posts, category_timeline, idf, k):
+    """
+    Score the candidates of one post as a list of (score, candidate id).
+
+    Shared-tag scores are a sparse dot product of idf-weighted tag
+    vectors, accumulated through the tag -> posts inverted lists. Posts
+    that only share the category rank by closeness in time, so only the
+    k nearest on each side can make the cut.
+    """
+    category_id, timestamp = post
+    shared = defaultdict(float)
+    for tag_id in tags:
+        weight = idf[tag_id]
+        for candidate in tag_posts[tag_id]:
+            shared[candidate] += weight
+    if category_id is not None:
+        for candidate in _category_window(category_timeline[category_id], timestamp, post_id, k):
+            shared.setdefault(candidate, 0.0)
+    shared.pop(post_id, None)
+
+    scored = []
+    for candidate, shared_idf in shared.items():
+        candidate_category, candidate_timestamp = posts[candidate]
+        same_category = category_id is not None and candidate_category == category_id
+        scored.append((related_score(shared_idf, same_category, timestamp - candidate_timestamp), candidate))
+    return scored
+
+
+def _load(apps, post_ids=None):
+    """
+    Published posts (id -> (category, timestamp)), their tags and the
+    inverted lists, restricted to what scoring post_ids needs when given.
+    """
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    Tag = apps.get_model('blog', 'Tag')
+    Through = BlogPost.tags.through
+    published = _published(apps)
+
+    links = Through.objects.filter(blogpost__status='published')
+    if post_ids is not None:
+        own_tags = Through.objects.filter(blogpost_id__in=post_ids).values('tag_id')
+        links = links.filter(tag_id__in=own_tags)
+
+    post_tags, tag_posts = defaultdict(list), defaultdict(list)
+    for post_id, tag_id in links.values_list('blogpost_id', 'tag_id').iterator(chunk_size=2000):
+        post_tags[post_id].append(tag_id)
+        tag_posts[tag_id].append(post_id)
+
+    if post_ids is None:
+        rows = published.values_list('id', 'category_id', 'published')
+    else:
+        categories = published.filter(id__in=post_ids).values('category_id')
+        rows = published.filter(category_id__in=categories) | published.filter(id__in=[*post_ids, *post_tags])
+        rows = rows.values_list('id', 'category_id', 'published')
+
+    posts, category_timeline = {}, defaultdict(list)
+    for post_id, category_id, published_at in rows.iterator(chunk_size=2000):
+        timestamp = published_at.timestamp()
+        posts[post_id] = (category_id, timestamp)
+        if category_id is not None:
+            category_timeline[category_id].append((timestamp, post_id))
+    for timeline in category_timeline.values():
+        timeline.sort()
+
+    post_count = published.count() if post_ids is not None else len(posts)
+    if post_ids is None:
+        frequencies = {tag_id: len(ids) for tag_id, ids in tag_posts.items()}
+    else:
+        frequencies = dict(Tag.objects.filter(id__in=list(tag_posts)).values_list('id', 'published_post_count'))
+    idf = {tag_id: tag_idf(post_count, frequencies.get(tag_id, 0)) for tag_id in tag_posts}
+    return posts, post_tags, tag_posts, category_timeline, idf
+
+
+def _candidates(post_id, data, k):
+    posts, post_tags, tag_posts, category_timeline, idf = data
+    if post_id not in posts:
+        return []
+    return _score_candidates(
+        post_id, posts[post_id], post_tags.get(post_id, ()), posts, tag_posts, category_timeline, idf, k)
+
+
+def _neighbor_rows(RelatedPost, post_ids, data, k):
+    rows = []
+    for post_id in post_ids:
+        neighbors = heapq.nlargest(k, _candidates(post_id, data, k))
+        rows.extend(
+            RelatedPost(post_id=post_id, related_id=candidate, score=score, rank=rank)
+            for rank, (score, candidate) in enumerate(neighbors))
+    return rows
+
+
+def rebuild_related_posts(apps=global_apps, k=RELATED_POSTS_COUNT):
+    """Recompute the neighbors of every published post. Returns the number of rows written"""
+    RelatedPost = apps.get_model('blog', 'RelatedPost')
+    data = _load(apps)
+    rows = _neighbor_rows(RelatedPost, list(data[0]), data, k)
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def update_related_posts(post_id, apps=global_apps, k=RELATED_POSTS_COUNT):
+    """
+    Recompute the neighbors of one post after its tags, category or
+    status changed, then of every post whose top k it enters or leaves.
+
+    Scores are symmetric, so the post belongs in a candidate's list
+    exactly when it beats that candidate's current k-th score. Tag idf
+    weights are global and drift as posts come and go; other lists keep
+    their old weights until the next rebuild_related_posts run.
+    """
+    RelatedPost = apps.get_model('blog', 'RelatedPost')
+    data = _load(apps, [post_id])
+    rows = _neighbor_rows(RelatedPost, [post_id], data, k)
+
+    # Posts listing this one may need to drop it; candidates may need to add it
+    affected = set(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True))
+    scores = {candidate: score for score, candidate in _candidates(post_id, data, k)}
+    if scores:
+        kth = defaultdict(list)
+        for owner, score in RelatedPost.objects.filter(post_id__in=list(scores)).values_list('post_id', 'score'):
+            kth[owner].append(score)
+        affected.update(
+            candidate for candidate, score in scores.items()
+            if len(kth[candidate]) < k or score > min(kth[candidate]))
+    affected.discard(post_id)
+
+    if affected:
+        neighbor_data = _load(apps, list(affected))
+        rows.extend(_neighbor_rows(RelatedPost, affected, neighbor_data, k))
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=[post_id, *affected]).delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=1000)
+        # Post pages show their related posts
+        bump_cache_version(LIST_VERSION_KEY)
+
+
+# Post ids already updated by the callbacks of the current commit.
+# De-duplicating when callbacks run, not when they're queued, means a
+# rolled-back transaction or savepoint can't leave anything stale behind.
+_updated = threading.local()
+
+
+def schedule_update(*post_ids):
+    """Recompute related posts once the transaction commits, once per post however many signals fire"""
+    updated = _updated.__dict__.setdefault('ids', set())
+    for post_id in set(post_ids):
+        # A new change needs a new update, even if an earlier commit already ran one
+        updated.discard(post_id)
+
+        def run(post_id=post_id):
+            if post_id not in updated:
+                updated.add(post_id)
+                update_related_posts(post_id)
+        transaction.on_commit(run)
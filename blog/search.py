@@ -0,0 +1,140 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+class BaseSearchBackend:
+    """
+    Interface for blog post search.
+
+    `search` takes a BlogPost queryset and returns the posts matching
+    `query` ordered by relevance, as a queryset or RankedResults.
+    `update_post` and `remove_post` are called from the BlogPost
+    post_save/post_delete signals (and BlogPostQuerySet.update) to keep
+    the index in sync.
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def update_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class RankedResults:
+    """
+    Posts in a rank order computed outside the database.
+
+    Behaves like a sequence for Paginator: len() costs nothing and a slice
+    fetches just that page by primary key.
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            ids = self.ids[index]
+            posts = self.queryset.in_bulk(ids)
+            return [posts[post_id] for post_id in ids if post_id in posts]
+        return self[index:index + 1 or None][0]
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Unindexed icontains search, used when no full-text index is available"""
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(content__icontains=query) |
+            Q(excerpt__icontains=query)
+        ).distinct()
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """
+    MATCH ... AGAINST over the FULLTEXT index on (title, excerpt, plain_text).
+
+    InnoDB maintains the index itself, so there is nothing to sync.
+    """
+    match_sql = (
+        'MATCH (blog_blogpost.title, blog_blogpost.excerpt, blog_blogpost.plain_text) '
+        'AGAINST (%s IN NATURAL LANGUAGE MODE)'
+    )
+
+    def search(self, queryset, query):
+        return queryset.annotate(
+            search_rank=RawSQL(self.match_sql, [query])
+        ).filter(search_rank__gt=0).order_by('-search_rank', '-created_at')
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Search through the blog_blogpost_fts FTS5 shadow table, ranked by bm25()"""
+    table = 'blog_blogpost_fts'
+
+    def to_match_query(self, query):
+        # Quote every term so user input can't inject FTS5 syntax; prefix-match each one
+        terms = ['"%s"*' % term.replace('"', '""') for term in query.split()]
+        return ' '.join(terms)
+
+    def search(self, queryset, query):
+        match = self.to_match_query(query)
+        if not match:
+            return queryset.none()
+        # bm25() is lower for better matches
+        rank_sql = (
+            f'SELECT bm25({self.table}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = blog_blogpost.id'
+        )
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(rank_sql, [match])
+        ).order_by('search_rank', '-created_at')
+
+    def update_post(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, excerpt, plain_text) VALUES (%s, %s, %s, %s)',
+                [post.pk, post.title, post.excerpt, post.plain_text])
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, excerpt, plain_text) '
+                f'SELECT id, title, excerpt, plain_text FROM blog_blogpost')
+
+
+VENDOR_BACKENDS = {
+    'mysql': MySQLFullTextBackend,
+    'sqlite': SQLiteFTSBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """Backend from settings.BLOG_SEARCH_BACKEND, or picked from the database vendor"""
+    path = getattr(settings, 'BLOG_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return VENDOR_BACKENDS.get(connection.vendor, DatabaseSearchBackend)()
@@ -0,0 +1,456 @@
+import heapq
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, no cross-process lock
+    fcntl = None
+
+from django.conf import settings
+from django.db import transaction
+
+from .search import BaseSearchBackend, RankedResults
+
+
+TOKEN_RE = re.compile(r'\w+')
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or '
+    'that the this to was were will with'.split())
+
+
+def tokenize(text):
+    """Lowercase word tokens, without stop words and single characters"""
+    return [
+        token for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+class BM25Scorer:
+    """BM25 ranking over anything exposing postings(), doc_length(), doc_count and total_length"""
+    k1 = 1.5
+    b = 0.75
+
+    def search(self, query, limit=None):
+        """Return (doc_id, score) pairs, best first: all matches, or the top `limit`"""
+        if not self.doc_count:
+            return []
+        avgdl = self.total_length / self.doc_count
+        scores = {}
+        for term in set(tokenize(query)):
+            docs, tfs = self.postings(term)
+            df = len(docs)
+            if not df:
+                continue
+            idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            for doc_id, tf in zip(docs, tfs):
+                norm = self.k1 * (1 - self.b + self.b * self.doc_length(doc_id) / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        if limit is None:
+            return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+class InvertedIndex(BM25Scorer):
+    """
+    Mutable in-memory inverted index.
+
+    Each posting list is a pair of parallel arrays (doc ids sorted
+    ascending, term frequencies), which keeps them compact and lets
+    `save` write them straight to disk.
+    """
+
+    def __init__(self):
+        self.terms = {}          # term -> (array('Q') doc ids, array('I') term frequencies)
+        self.lengths = {}        # doc id -> number of tokens
+        self.total_length = 0
+
+    @property
+    def doc_count(self):
+        return len(self.lengths)
+
+    def postings(self, term):
+        return self.terms.get(term, ((), ()))
+
+    def doc_length(self, doc_id):
+        return self.lengths[doc_id]
+
+    def add_document(self, doc_id, text):
+        """Index `text` under doc_id, replacing any previous version"""
+        self.remove_document(doc_id)
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            docs, tfs = self.terms.setdefault(term, (array('Q'), array('I')))
+            position = bisect_left(docs, doc_id)
+            docs.insert(position, doc_id)
+            tfs.insert(position, tf)
+        self.lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove_document(self, doc_id):
+        self.remove_documents({doc_id})
+
+    def remove_documents(self, doc_ids):
+        """Drop several documents in one pass over the posting lists"""
+        doc_ids = {doc_id for doc_id in doc_ids if doc_id in self.lengths}
+        if not doc_ids:
+            return
+        for doc_id in doc_ids:
+            self.total_length -= self.lengths.pop(doc_id)
+        for term in list(self.terms):
+            docs, tfs = self.terms[term]
+            if not any(doc_id in doc_ids for doc_id in docs):
+                continue
+            kept = [i for i, doc_id in enumerate(docs) if doc_id not in doc_ids]
+            if kept:
+                self.terms[term] = (array('Q', (docs[i] for i in kept)), array('I', (tfs[i] for i in kept)))
+            else:
+                del self.terms[term]
+
+    # File layout (native byte order):
+    #   header      MAGIC, doc_count, term_count, total_length, term blob size
+    #   doc table   doc ids (Q, sorted) then lengths (I)
+    #   term table  per term: posting offset (Q), posting count (I), name length (I)
+    #   term blob   utf-8 term names, in term table order
+    #   postings    per term: doc ids (Q) then term frequencies (I)
+    MAGIC = b'BM25IDX1'
+    HEADER = struct.Struct('=8sQQQQ')
+    TERM_ENTRY = struct.Struct('=QII')
+
+    def save(self, path):
+        """Write the index to `path` atomically"""
+        doc_ids = array('Q', sorted(self.lengths))
+        lengths = array('I', (self.lengths[doc_id] for doc_id in doc_ids))
+        names = sorted(self.terms)
+        encoded = [name.encode() for name in names]
+        blob = b''.join(encoded)
+
+        postings_start = (
+            self.HEADER.size + doc_ids.itemsize * len(doc_ids) + lengths.itemsize * len(lengths)
+            + self.TERM_ENTRY.size * len(names) + len(blob))
+        entries = []
+        offset = postings_start
+        for name, raw in zip(names, encoded):
+            docs, _ = self.terms[name]
+            entries.append(self.TERM_ENTRY.pack(offset, len(docs), len(raw)))
+            offset += len(docs) * (8 + 4)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.search-index-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, len(doc_ids), len(names), self.total_length, len(blob)))
+                doc_ids.tofile(f)
+                lengths.tofile(f)
+                f.write(b''.join(entries))
+                f.write(blob)
+                for name in names:
+                    docs, tfs = self.terms[name]
+                    docs.tofile(f)
+                    tfs.tofile(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved index fully into memory so it can be modified"""
+        index = cls()
+        mapped = MappedIndex(path)
+        try:
+            index.total_length = mapped.total_length
+            index.lengths = dict(zip(mapped.doc_ids, mapped.lengths))
+            for term in mapped.offsets:
+                docs, tfs = mapped.postings(term)
+                index.terms[term] = (array('Q', docs), array('I', tfs))
+                docs.release()
+                tfs.release()
+        finally:
+            mapped.close()
+        return index
+
+
+class MappedIndex(BM25Scorer):
+    """
+    Read-only view of a saved index through mmap.
+
+    Posting lists are memoryview casts into the mapping, so queries read
+    only the pages they touch and every worker shares the OS page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self.mmap)
+        header = InvertedIndex.HEADER
+        magic, self.doc_count, term_count, self.total_length, blob_size = header.unpack_from(self.mmap)
+        if magic != InvertedIndex.MAGIC:
+            raise ValueError(f'{path} is not a search index')
+
+        pos = header.size
+        self.doc_ids = view[pos:pos + 8 * self.doc_count].cast('Q')
+        pos += 8 * self.doc_count
+        self.lengths = view[pos:pos + 4 * self.doc_count].cast('I')
+        pos += 4 * self.doc_count
+
+        entry = InvertedIndex.TERM_ENTRY
+        blob_pos = pos + entry.size * term_count
+        self.offsets = {}
+        for i in range(term_count):
+            offset, count, name_size = entry.unpack_from(self.mmap, pos + i * entry.size)
+            name = bytes(view[blob_pos:blob_pos + name_size]).decode()
+            blob_pos += name_size
+            self.offsets[name] = (offset, count)
+
+    def postings(self, term):
+        if term not in self.offsets:
+            return (), ()
+        offset, count = self.offsets[term]
+        view = memoryview(self.mmap)
+        docs = view[offset:offset + 8 * count].cast('Q')
+        tfs = view[offset + 8 * count:offset + 12 * count].cast('I')
+        return docs, tfs
+
+    def doc_length(self, doc_id):
+        return self.lengths[bisect_left(self.doc_ids, doc_id)]
+
+    def __contains__(self, doc_id):
+        position = bisect_left(self.doc_ids, doc_id)
+        return position < len(self.doc_ids) and self.doc_ids[position] == doc_id
+
+    def is_stale(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) != (
+            self.stat.st_ino, self.stat.st_mtime_ns, self.stat.st_size)
+
+    def close(self):
+        # Release the memoryviews before closing the mapping
+        self.doc_ids.release()
+        self.lengths.release()
+        self.mmap.close()
+
+
+# Delta log records: op (b'A' add/replace, b'D' delete), doc id, text size, then the utf-8 text
+DELTA_RECORD = struct.Struct('=cQI')
+
+
+def append_delta(path, op, doc_id, text=''):
+    encoded = text.encode()
+    with open(path, 'ab') as f:
+        f.write(DELTA_RECORD.pack(op, doc_id, len(encoded)) + encoded)
+
+
+def read_delta(path):
+    """
+    Replay the delta log as (InvertedIndex of the documents it adds,
+    set of every doc id it touches). A record still being appended is ignored.
+    """
+    overlay, touched = InvertedIndex(), set()
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return overlay, touched
+    position = 0
+    while position + DELTA_RECORD.size <= len(data):
+        op, doc_id, size = DELTA_RECORD.unpack_from(data, position)
+        end = position + DELTA_RECORD.size + size
+        if end > len(data):
+            break
+        touched.add(doc_id)
+        if op == b'A':
+            overlay.add_document(doc_id, data[position + DELTA_RECORD.size:end].decode())
+        else:
+            overlay.remove_document(doc_id)
+        position = end
+    return overlay, touched
+
+
+def _file_identity(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class IndexSnapshot(BM25Scorer):
+    """
+    The merged segment plus the delta log, read as one index.
+
+    Documents the delta touches are masked out of the segment and served
+    from the delta's overlay. A snapshot is never modified: a newer one
+    replaces it, so queries already scoring against it are unaffected.
+    """
+
+    def __init__(self, segment, delta_path):
+        self.segment = segment
+        self.delta_path = delta_path
+        self.delta_identity = _file_identity(delta_path)
+        self.overlay, touched = read_delta(delta_path)
+        self.masked = {doc_id for doc_id in touched if doc_id in segment}
+        masked_length = sum(segment.doc_length(doc_id) for doc_id in self.masked)
+        self.doc_count = segment.doc_count - len(self.masked) + self.overlay.doc_count
+        self.total_length = segment.total_length - masked_length + self.overlay.total_length
+
+    def postings(self, term):
+        docs, tfs = self.segment.postings(term)
+        extra_docs, extra_tfs = self.overlay.postings(term)
+        if not self.masked and not extra_docs:
+            return docs, tfs
+        pairs = [(doc_id, tf) for doc_id, tf in zip(docs, tfs) if doc_id not in self.masked]
+        pairs.extend(zip(extra_docs, extra_tfs))
+        return [doc_id for doc_id, _ in pairs], [tf for _, tf in pairs]
+
+    def doc_length(self, doc_id):
+        length = self.overlay.lengths.get(doc_id)
+        return length if length is not None else self.segment.doc_length(doc_id)
+
+    def is_stale(self):
+        return self.segment.is_stale() or _file_identity(self.delta_path) != self.delta_identity
+
+
+class BM25SearchBackend(BaseSearchBackend):
+    """
+    Pure-Python search backend, independent of database full-text support.
+
+    Published posts live in a merged index segment at
+    settings.BLOG_SEARCH_INDEX_PATH plus an append-only delta log next to
+    it. A post save appends one record to the log, which is O(post)
+    rather than a rewrite of the whole index. Once the log outgrows
+    BLOG_SEARCH_DELTA_MAX_BYTES it is merged into a new segment, which
+    replaces the old one atomically. Queries run against an mmap of the
+    segment plus the replayed log, re-read whenever either file changes.
+    """
+    max_results = 1000
+    # Ranked ids are checked against the caller's queryset this many at a time
+    filter_batch_size = 500
+
+    def __init__(self, path=None):
+        self.path = str(path or getattr(
+            settings, 'BLOG_SEARCH_INDEX_PATH', settings.BASE_DIR / 'blog_search.idx'))
+        self.delta_path = self.path + '.delta'
+        self.delta_max_bytes = getattr(settings, 'BLOG_SEARCH_DELTA_MAX_BYTES', 4 * 1024 * 1024)
+        self.snapshot = None
+        self.snapshot_lock = threading.Lock()
+
+    def get_snapshot(self):
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.is_stale():
+            with self.snapshot_lock:
+                if self.snapshot is snapshot:
+                    if not os.path.exists(self.path):
+                        self.rebuild()
+                    segment = snapshot.segment if snapshot and not snapshot.segment.is_stale() else MappedIndex(self.path)
+                    # Replaced, never closed: a query still scoring the old one keeps
+                    # its mapping alive, and it is unmapped once the last view goes
+                    self.snapshot = IndexSnapshot(segment, self.delta_path)
+                snapshot = self.snapshot
+        return snapshot
+
+    def search(self, queryset, query):
+        scored = self.get_snapshot().search(query)
+        # Apply the caller's filters (status, category, tag...) before cutting to
+        # max_results, in rank order, so filtered searches don't come up short
+        ranked = []
+        for start in range(0, len(scored), self.filter_batch_size):
+            batch = [doc_id for doc_id, _ in scored[start:start + self.filter_batch_size]]
+            allowed = set(queryset.filter(id__in=batch).values_list('id', flat=True))
+            ranked.extend(doc_id for doc_id in batch if doc_id in allowed)
+            if len(ranked) >= self.max_results:
+                break
+        return RankedResults(ranked[:self.max_results], queryset)
+
+    def document_text(self, post):
+        return f'{post.title} {post.title} {post.excerpt} {post.plain_text}'
+
+    def update_post(self, post):
+        if post.status == 'published':
+            text = self.document_text(post)
+            transaction.on_commit(lambda: self._append(b'A', post.pk, text))
+        else:
+            self.remove_post(post.pk)
+
+    def remove_post(self, post_id):
+        transaction.on_commit(lambda: self._append(b'D', post_id))
+
+    def rebuild(self):
+        from .models import BlogPost
+
+        index = InvertedIndex()
+        posts = BlogPost.objects.published().with_content().only(
+            'id', 'title', 'excerpt', 'plain_text')
+        for post in posts.iterator(chunk_size=500):
+            index.add_document(post.pk, self.document_text(post))
+        with self._lock():
+            index.save(self.path)
+            self._clear_delta()
+
+    def merge(self):
+        """Fold the delta log into a new segment"""
+        with self._lock():
+            self._merge()
+
+    def _append(self, op, doc_id, text=''):
+        with self._lock():
+            append_delta(self.delta_path, op, doc_id, text)
+            if os.path.getsize(self.delta_path) > self.delta_max_bytes:
+                self._merge()
+
+    def _merge(self):
+        index = InvertedIndex.load(self.path) if os.path.exists(self.path) else InvertedIndex()
+        overlay, touched = read_delta(self.delta_path)
+        index.remove_documents(touched)
+        for term, (docs, tfs) in overlay.terms.items():
+            base_docs, base_tfs = index.terms.get(term, ((), ()))
+            pairs = sorted(zip([*base_docs, *docs], [*base_tfs, *tfs]))
+            index.terms[term] = (array('Q', (doc_id for doc_id, _ in pairs)), array('I', (tf for _, tf in pairs)))
+        index.lengths.update(overlay.lengths)
+        index.total_length += overlay.total_length
+        index.save(self.path)
+        self._clear_delta()
+
+    def _clear_delta(self):
+        # A new (empty) file, so readers see a new identity even if sizes match
+        directory = os.path.dirname(os.path.abspath(self.delta_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.search-delta-')
+        os.close(fd)
+        os.replace(tmp_path, self.delta_path)
+
+    def _lock(self):
+        return _FileLock(self.path + '.lock')
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        if fcntl:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
@@ -0,0 +1,193 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from base.conditional import bump_cache_version
+
+from . import home_cache
+from .comments import invalidate_comments
+from .counters import (
+    COUNTED_POST_FIELDS, adjust_comment_counter, adjust_post_counters, move_post_counters, post_counted_state,
+)
+from .models import LIST_VERSION_KEY, SEARCH_FIELDS, BlogPost, Category, Comment, RelatedPost, Tag
+from .related import schedule_update
+from .search import get_search_backend
+
+# Keep the denormalized counters in step with BlogPost, its tags and Comment.
+# Handlers run inside the writing transaction; recount_blog_counters repairs drift.
+# BlogPostQuerySet.update applies the same changes to bulk updates.
+
+
+@receiver(pre_save, sender=BlogPost)
+def remember_post_state(sender, instance, raw, update_fields=None, **kwargs):
+    instance._previous_counted_state = None
+    instance._skip_counters = update_fields is not None and COUNTED_POST_FIELDS.isdisjoint(update_fields)
+    if instance.pk and not instance._state.adding and not instance._skip_counters:
+        previous = BlogPost._base_manager.filter(pk=instance.pk).values_list(
+            'status', 'category_id', 'author_id').first()
+        if previous:
+            instance._previous_counted_state = post_counted_state(*previous)
+
+
+@receiver(post_save, sender=BlogPost)
+def update_post_counters(sender, instance, created, raw, **kwargs):
+    if raw or getattr(instance, '_skip_counters', False):
+        return
+    previous = getattr(instance, '_previous_counted_state', None)
+    current = post_counted_state(instance.status, instance.category_id, instance.author_id)
+    if previous == current:
+        return
+
+    # Tags only move when the post is published or unpublished
+    tag_ids = []
+    if bool(previous and previous[0]) != current[0]:
+        home_cache.invalidate_post_tags()
+        if not created:
+            tag_ids = list(instance.tags.values_list('id', flat=True))
+    move_post_counters(previous, current, tag_ids)
+    bump_cache_version(LIST_VERSION_KEY)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def release_post_counters(sender, instance, **kwargs):
+    previous = BlogPost._base_manager.filter(pk=instance.pk).values_list(
+        'status', 'category_id', 'author_id').first()
+    if previous and previous[0] == 'published':
+        tag_ids = list(BlogPost.tags.through.objects.filter(blogpost_id=instance.pk).values_list('tag_id', flat=True))
+        adjust_post_counters(previous[1], previous[2], tag_ids, -1)
+        home_cache.invalidate_post_tags()
+        bump_cache_version(LIST_VERSION_KEY)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def update_tag_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # tag.posts.add/remove/clear: instance is a Tag, pk_set holds post ids
+        links = sender.objects.filter(tag_id=instance.pk, blogpost__status='published')
+        linked_field, id_lookup = 'blogpost_id', 'blogpost_id__in'
+    else:
+        # post.tags.add/remove/clear: instance is a BlogPost, pk_set holds tag ids
+        if instance.status != 'published':
+            return
+        links = sender.objects.filter(blogpost_id=instance.pk)
+        linked_field, id_lookup = 'tag_id', 'tag_id__in'
+
+    if action in ('pre_remove', 'pre_clear'):
+        # Remember which links really exist (and count) before they go away
+        if action == 'pre_remove':
+            links = links.filter(**{id_lookup: pk_set})
+        instance._removed_links = set(links.values_list(linked_field, flat=True))
+        return
+
+    if action == 'post_add' and pk_set:
+        # pk_set only holds the links that were actually created
+        changed, delta = set(links.filter(**{id_lookup: pk_set}).values_list(linked_field, flat=True)), 1
+    elif action in ('post_remove', 'post_clear'):
+        changed, delta = getattr(instance, '_removed_links', set()), -1
+        instance._removed_links = set()
+    else:
+        return
+
+    if not changed:
+        return
+    if reverse:
+        adjust_post_counters(None, None, [instance.pk], delta * len(changed))
+    else:
+        adjust_post_counters(None, None, changed, delta)
+    bump_cache_version(LIST_VERSION_KEY)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_state(sender, instance, raw, **kwargs):
+    instance._was_approved = False
+    if instance.pk and not instance._state.adding:
+        instance._was_approved = bool(Comment.objects.filter(pk=instance.pk, is_approved=True).exists())
+
+
+@receiver(post_save, sender=Comment)
+def update_comment_counter(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    delta = int(instance.is_approved) - int(getattr(instance, '_was_approved', False))
+    if delta:
+        adjust_comment_counter(instance.post_id, delta)
+
+
+@receiver(pre_delete, sender=Comment)
+def release_comment_counter(sender, instance, **kwargs):
+    if Comment.objects.filter(pk=instance.pk, is_approved=True).exists():
+        adjust_comment_counter(instance.post_id, -1)
+
+
+# Receivers rather than Comment.save/delete, so queryset deletes and cascades
+# from a post, a parent comment or a user drop the cached pages too
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_comments(instance.post_id)
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+def invalidate_home_page(sender, raw=False, **kwargs):
+    if not raw:
+        home_cache.invalidate_for(sender)
+        # Posts render their category and tag names; a post's own changes move its updated_at
+        if sender is not BlogPost:
+            bump_cache_version(LIST_VERSION_KEY)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def invalidate_home_page_tags(sender, action, **kwargs):
+    if action.startswith('post_'):
+        home_cache.invalidate_for(BlogPost)
+        home_cache.invalidate_post_tags()
+        # Tag chips change even for drafts and with no updated_at bump
+        bump_cache_version(LIST_VERSION_KEY)
+
+
+@receiver(post_save, sender=BlogPost)
+def update_related_posts_on_save(sender, instance, created, raw, **kwargs):
+    if raw or getattr(instance, '_skip_counters', False):
+        return
+    previous = getattr(instance, '_previous_counted_state', None)
+    before = previous[:2] if previous else (False, None)
+    after = (instance.status == 'published', instance.category_id)
+    # Only publishing, unpublishing or moving a published post changes the neighbors
+    if before != after and (before[0] or after[0]):
+        schedule_update(instance.pk)
+
+
+@receiver(pre_delete, sender=BlogPost)
+def update_related_posts_on_delete(sender, instance, **kwargs):
+    # The post's own rows cascade; the posts listing it need a replacement
+    schedule_update(*RelatedPost.objects.filter(related_id=instance.pk).values_list('post_id', flat=True))
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def update_related_posts_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    # add/remove/clear run in a transaction, so the updates happen after the change
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear') and instance.status == 'published':
+            schedule_update(instance.pk)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        schedule_update(*pk_set)
+    elif action == 'pre_clear':
+        schedule_update(*sender.objects.filter(tag_id=instance.pk).values_list('blogpost_id', flat=True))
+
+
+# Signals rather than BlogPost.save/delete, so queryset.delete() and
+# save(update_fields=[...]) are covered too; BlogPostQuerySet.update reindexes itself
+@receiver(post_save, sender=BlogPost)
+def update_search_index(sender, instance, raw, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or not SEARCH_FIELDS.isdisjoint(update_fields)):
+        get_search_backend().update_post(instance)
+
+
+@receiver(post_delete, sender=BlogPost)
+def remove_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove_post(instance.pk)
@@ -1,3 +1,660 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Count, Q, Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import home_cache
+from .comments import get_first_page
+from .counters import recount_all
+from .related import rebuild_related_posts, update_related_posts
+from .models import AuthorStats, BlogPost, Category, Comment, RelatedPost, Tag, TagPopularity
+from .popularity import popular_tags, popularity_score, refresh_tag_popularity
+from .search import SQLiteFTSBackend, get_search_backend
+from .search_index import BM25SearchBackend
+from .view_counter import ViewCountBuffer
+
+
+def make_post(author, title, status='published', content=None, **kwargs):
+    return BlogPost.objects.create(
+        title=title, author=author, content=content or f'Some **markdown** about {title}', status=status, **kwargs)
+
+
+class RelatedPostScheduleTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pw')
+        self.tags = [Tag.objects.create(name=name) for name in ('bfs', 'dfs')]
+
+    def test_one_update_per_post_per_transaction(self):
+        with mock.patch('blog.related.update_related_posts') as update:
+            with self.captureOnCommitCallbacks(execute=True):
+                post = make_post(self.author, 'Graphs')
+                post.tags.add(self.tags[0])
+                post.tags.add(self.tags[1])
+                post.save()
+            update.assert_called_once_with(post.pk)
+
+            # The queued id is released when its callback runs
+            with self.captureOnCommitCallbacks(execute=True):
+                post.tags.remove(self.tags[0])
+            self.assertEqual(update.call_count, 2)
+
+
+class CommentListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+        cls.post = make_post(cls.author, 'Trees')
+        cls.comment = Comment.objects.create(post=cls.post, author=cls.author, content='Top')
+        Comment.objects.create(post=cls.post, author=cls.author, content='Reply', parent=cls.comment)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_queryset_delete_drops_the_cached_first_page(self):
+        self.assertEqual(len(get_first_page(self.post)[0]), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.filter(pk=self.comment.pk).delete()
+        self.assertEqual(get_first_page(self.post)[0], [])
+        response = self.client.get(reverse('blog:comment_list', args=[self.post.slug]))
+        self.assertEqual(response.json()['comments'], [])
+
+    def test_replies_page(self):
+        response = self.client.get(reverse('blog:comment_list', args=[self.post.slug]), {'parent': self.comment.pk})
+        self.assertEqual([c['content'] for c in response.json()['comments']], ['Reply'])
+
+    def test_replies_come_with_their_subtree_from_one_query(self):
+        parent = Comment.objects.get(content='Reply')
+        for depth in range(5):
+            parent = Comment.objects.create(post=self.post, author=self.author, content=f'Depth {depth}', parent=parent)
+        Comment.objects.create(post=self.post, author=self.author, content='Hidden', parent=parent, is_approved=False)
+        url = reverse('blog:comment_list', args=[self.post.slug])
+        with self.assertNumQueries(2):  # the post, then every approved reply
+            response = self.client.get(url, {'parent': self.comment.pk})
+
+        contents, items = [], response.json()['comments']
+        while items:
+            self.assertEqual(len(items), 1)
+            contents.append(items[0]['content'])
+            items = items[0]['replies']
+        self.assertEqual(contents, ['Reply'] + [f'Depth {depth}' for depth in range(5)])
+
+    def reply_contents(self):
+        response = self.client.get(reverse('blog:comment_list', args=[self.post.slug]), {'parent': self.comment.pk})
+        return [c['content'] for c in response.json()['comments']]
+
+    def test_reply_subtrees_follow_queryset_deletes_and_bulk_moderation(self):
+        self.assertEqual(self.reply_contents(), ['Reply'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.filter(content='Reply').delete()
+        self.assertEqual(self.reply_contents(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reply = Comment.objects.create(post=self.post, author=self.author, content='Second', parent=self.comment)
+        self.assertEqual(self.reply_contents(), ['Second'])
+        self.client.force_login(User.objects.create_superuser('moderator', password='pw'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:blog_comment_changelist'),
+                             {'action': 'disapprove_comments', '_selected_action': [reply.pk]})
+        self.assertEqual(self.reply_contents(), [])
+
+    def test_invalid_parent_is_a_bad_request(self):
+        url = reverse('blog:comment_list', args=[self.post.slug])
+        for parent in ('abc', '²', '-'):
+            with self.subTest(parent=parent):
+                self.assertEqual(self.client.get(url, {'parent': parent}).status_code, 400)
+
+
+class SearchIndexSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+
+    def search_titles(self, query):
+        return [post.title for post in get_search_backend().search(BlogPost.objects.published(), query)]
+
+    def test_status_only_save_reindexes(self):
+        post = make_post(self.author, 'Dijkstra', status='draft')
+        with mock.patch.object(get_search_backend(), 'update_post') as update_post:
+            post.status = 'published'
+            post.save(update_fields=['status'])
+        update_post.assert_called_once_with(post)
+
+    def test_queryset_update_and_delete_stay_in_sync(self):
+        if not isinstance(get_search_backend(), SQLiteFTSBackend):
+            self.skipTest('checks the SQLite FTS table')
+        post = make_post(self.author, 'Kruskal')
+        self.assertEqual(self.search_titles('prim'), [])
+        BlogPost.objects.filter(pk=post.pk).update(title='Prim')
+        self.assertEqual(self.search_titles('prim'), ['Prim'])
+
+        BlogPost.objects.filter(pk=post.pk).delete()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM blog_blogpost_fts WHERE rowid = %s', [post.pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class BM25SearchBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pw')
+        cls.graphs = Category.objects.create(name='Graphs')
+        cls.posts = [make_post(cls.author, f'Sorting part {i}') for i in range(6)]
+        # A long post mentioning the term once ranks below all the others
+        cls.long_post = make_post(
+            cls.author, 'Graph notes', category=cls.graphs,
+            content='Sorting aside, ' + ' '.join(f'vertex{i}' for i in range(300)))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backend = BM25SearchBackend(os.path.join(directory.name, 'search.idx'))
+        self.backend.rebuild()
+
+    def ids(self, query, queryset=None):
+        results = self.backend.search(queryset or BlogPost.objects.published(), query)
+        return [post.pk for post in results[0:len(results)]]
+
+    def save(self, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+            self.backend.update_post(post)
+
+    def test_updates_append_to_the_delta_without_rewriting_the_index(self):
+        segment = os.stat(self.backend.path)
+        post = make_post(self.author, 'Topological ordering', status='draft')
+        post.status = 'published'
+        self.save(post)
+        self.assertEqual(self.ids('topological'), [post.pk])
+        self.assertEqual(os.stat(self.backend.path).st_mtime_ns, segment.st_mtime_ns)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.backend.remove_post(self.posts[0].pk)
+        self.assertNotIn(self.posts[0].pk, self.ids('sorting'))
+
+    def test_merge_matches_a_rebuild(self):
+        edited = self.posts[1]
+        edited.title = 'Merge sort, sorting by merging'
+        self.save(edited)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.backend.remove_post(self.posts[2].pk)
+        BlogPost.objects.filter(pk=self.posts[2].pk).update(status='draft')
+        incremental = self.backend.get_snapshot().search('sorting merge')
+
+        self.backend.merge()
+        self.assertEqual(os.path.getsize(self.backend.delta_path), 0)
+        merged = self.backend.get_snapshot().search('sorting merge')
+        self.backend.rebuild()
+        rebuilt = self.backend.get_snapshot().search('sorting merge')
+        for results in (incremental, merged):
+            self.assertEqual([doc_id for doc_id, _ in results], [doc_id for doc_id, _ in rebuilt])
+            for (_, score), (_, expected) in zip(results, rebuilt):
+                self.assertAlmostEqual(score, expected)
+
+    def test_old_snapshot_stays_usable(self):
+        old = self.backend.get_snapshot()
+        self.backend.rebuild()
+        self.assertIsNot(self.backend.get_snapshot(), old)
+        self.assertEqual(len(old.search('sorting')), len(self.posts) + 1)
+
+    def test_filters_apply_before_the_result_limit(self):
+        self.assertEqual(self.ids('sorting')[-1], self.long_post.pk)
+        self.backend.max_results = 2
+        self.backend.filter_batch_size = 2
+        self.assertEqual(self.ids('sorting', BlogPost.objects.published().filter(category=self.graphs)),
+                         [self.long_post.pk])
+
+
+class ViewCountBufferTests(TransactionTestCase):
+    def setUp(self):
+        author = User.objects.create_user('writer')
+        self.posts = [make_post(author, f'Post {i}') for i in range(3)]
+
+    def test_concurrent_increments_are_not_lost(self):
+        # Small max_pending so the threads flush while others keep incrementing
+        buffer = ViewCountBuffer(flush_interval=3600, max_pending=50)
+        per_thread = 200
+
+        def view():
+            try:
+                for i in range(per_thread):
+                    buffer.increment(self.posts[i % len(self.posts)].id)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=view) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        buffer.flush()
+
+        total = sum(BlogPost.objects.values_list('views_count', flat=True))
+        self.assertEqual(total, 8 * per_thread)
+
+    def test_failed_flush_keeps_the_views(self):
+        buffer = ViewCountBuffer(flush_interval=3600, max_pending=1)
+        post_id = self.posts[0].id
+        with mock.patch.object(buffer, '_write', side_effect=RuntimeError('database is down')):
+            with self.assertLogs('blog.view_counter', 'ERROR'):
+                self.assertEqual(buffer.increment(post_id), 1)
+        self.assertEqual(buffer.pending(post_id), 1)
+        buffer.flush()
+        self.assertEqual(BlogPost.objects.get(id=post_id).views_count, 1)
+
+
+class ListingQueryCountTests(TestCase):
+    """Listing pages load authors, categories and tags in a fixed number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('lister', password='pw')
+        cls.category = Category.objects.create(name='Sorting')
+        cls.tags = [Tag.objects.create(name=name) for name in ('merge', 'quick')]
+
+    def add_posts(self, n):
+        for i in range(n):
+            post = make_post(self.author, f'Sorting post {BlogPost.objects.count()}',
+                             category=self.category, is_featured=i == 0)
+            post.tags.set(self.tags)
+
+    def assertConstantQueries(self, num, url, params=None):
+        for total in (2, 9):
+            self.add_posts(total - BlogPost.objects.count())
+            # Home fragments are cached; measure the cold path
+            cache.clear()
+            with self.subTest(posts=total), self.assertNumQueries(num):
+                response = self.client.get(url, params)
+            self.assertContains(response, f'Sorting post {total - 1}')
+
+    def test_home(self):
+        self.assertConstantQueries(6, reverse('blog:home'))
+
+    def test_category(self):
+        self.assertConstantQueries(5, reverse('blog:category_posts', args=[self.category.slug]))
+
+    def test_tag(self):
+        self.assertConstantQueries(5, reverse('blog:tag_posts', args=[self.tags[0].slug]))
+
+    def test_search(self):
+        self.assertConstantQueries(3, reverse('blog:search'), {'q': 'sorting'})
+
+    def test_author_posts(self):
+        self.client.force_login(self.author)
+        self.assertConstantQueries(4, reverse('blog:my_posts'))
+
+
+class CounterTests(TestCase):
+    """Counters maintained incrementally agree with recount_all()"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('counted')
+        cls.other_author = User.objects.create_user('counted2')
+        cls.sorting, cls.graphs = Category.objects.create(name='Sorting'), Category.objects.create(name='Graphs')
+        cls.tags = [Tag.objects.create(name=name) for name in ('heap', 'stack', 'queue')]
+
+    def counters(self):
+        return (
+            dict(Category.objects.values_list('name', 'published_post_count')),
+            dict(Tag.objects.values_list('name', 'published_post_count')),
+            {author: n for author, n in AuthorStats.objects.values_list('author__username', 'published_post_count')
+             if n},
+            dict(BlogPost.objects.values_list('title', 'approved_comment_count')),
+        )
+
+    def assertMatchesRecount(self):
+        incremental = self.counters()
+        recount_all()
+        self.assertEqual(incremental, self.counters())
+
+    def unapprove(self, comment):
+        comment.is_approved = False
+        comment.save()
+
+    def test_post_lifecycle(self):
+        post = make_post(self.author, 'Heaps', category=self.sorting)
+        post.tags.set(self.tags[:2])
+        draft = make_post(self.author, 'Stacks', status='draft', category=self.sorting)
+        draft.tags.set(self.tags[1:])
+        self.assertMatchesRecount()
+
+        steps = [
+            ('publish', lambda: setattr(draft, 'status', 'published') or draft.save()),
+            ('unpublish', lambda: setattr(post, 'status', 'draft') or post.save()),
+            ('republish', lambda: setattr(post, 'status', 'published') or post.save()),
+            ('re-categorise', lambda: setattr(post, 'category', self.graphs) or post.save()),
+            ('change author', lambda: setattr(post, 'author', self.other_author) or post.save()),
+            ('add tag', lambda: post.tags.add(self.tags[2])),
+            ('remove tag', lambda: post.tags.remove(self.tags[0])),
+            ('tag side add', lambda: self.tags[0].posts.add(draft)),
+            ('tag side clear', lambda: self.tags[1].posts.clear()),
+            ('comment', lambda: Comment.objects.create(post=post, author=self.author, content='Hi')),
+            ('unapprove comment', lambda: self.unapprove(Comment.objects.get(post=post))),
+            ('delete', lambda: draft.delete()),
+            ('queryset delete', lambda: BlogPost.objects.filter(pk=post.pk).delete()),
+        ]
+        for name, step in steps:
+            with self.subTest(step=name):
+                step()
+                self.assertMatchesRecount()
+
+    def test_bulk_updates_move_the_counters(self):
+        posts = [make_post(self.author, f'Bulk {i}', category=self.sorting) for i in range(3)]
+        for post in posts:
+            post.tags.set(self.tags)
+        steps = [
+            ('unpublish', {'status': 'draft'}),
+            ('re-categorise drafts', {'category': self.graphs}),
+            ('publish', {'status': 'published'}),
+            ('re-categorise by id', {'category_id': self.sorting.pk}),
+            ('change author', {'author': self.other_author}),
+        ]
+        for name, kwargs in steps:
+            with self.subTest(step=name):
+                BlogPost.objects.filter(pk__in=[p.pk for p in posts[:2]]).update(**kwargs)
+                self.assertMatchesRecount()
+
+
+class PageValidatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('validated')
+        cls.category = Category.objects.create(name='Greedy')
+        cls.tags = [Tag.objects.create(name=name) for name in ('mst', 'huffman')]
+        cls.post = make_post(cls.author, 'Kruskal', category=cls.category)
+        cls.post.tags.set(cls.tags[:1])
+
+    def setUp(self):
+        cache.clear()
+        # Keep post_detail's view buffer (and its flusher thread) out of the test
+        patcher = mock.patch('blog.views.view_counter')
+        patcher.start().increment.return_value = 0
+        self.addCleanup(patcher.stop)
+
+    def test_related_changes_move_the_etag(self):
+        other = make_post(self.author, 'Prim', status='draft', category=self.category)
+        urls = [
+            reverse('blog:post_detail', args=[self.post.slug]),
+            reverse('blog:category_posts', args=[self.category.slug]),
+            reverse('blog:tag_posts', args=[self.tags[0].slug]),
+        ]
+        changes = {
+            'tag added': lambda: self.post.tags.add(self.tags[1]),
+            'tag renamed': lambda: Tag.objects.get(pk=self.tags[1].pk).save(),
+            'related posts': lambda: update_related_posts(self.post.pk),
+            'author count': lambda: BlogPost.objects.filter(pk=other.pk).update(status='published'),
+        }
+        for name, change in changes.items():
+            with self.subTest(change=name):
+                before = [self.client.get(url)['ETag'] for url in urls]
+                self.assertEqual(self.client.get(urls[0], HTTP_IF_NONE_MATCH=before[0]).status_code, 304)
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                after = [self.client.get(url)['ETag'] for url in urls]
+                for url, old, new in zip(urls, before, after):
+                    self.assertNotEqual(old, new, url)
+
+
+class HomeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('homer', password='pw')
+        self.tag = Tag.objects.create(name='trie')
+
+    def fragment(self, name, value):
+        build = mock.Mock(return_value=value)
+        return home_cache.get_fragments({name: build})[name], build
+
+    def test_version_bump_serves_fresh_fragment(self):
+        self.assertEqual(self.fragment('recent_posts', 'old')[0], 'old')
+        value, build = self.fragment('recent_posts', 'new')
+        self.assertEqual(value, 'old')
+        build.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            home_cache.invalidate('recent_posts')
+        value, build = self.fragment('recent_posts', 'new')
+        self.assertEqual(value, 'new')
+        build.assert_called_once()
+
+    def test_held_lock_serves_stale_value(self):
+        self.fragment('recent_posts', 'old')
+        with self.captureOnCommitCallbacks(execute=True):
+            home_cache.invalidate('recent_posts')
+        cache.add(home_cache.lock_key('recent_posts'), 1)
+
+        value, build = self.fragment('recent_posts', 'new')
+        self.assertEqual(value, 'old')
+        build.assert_not_called()
+
+    def test_popular_tags_follow_status_and_tag_changes_only(self):
+        post = make_post(self.author, 'Tries', status='draft')
+        changes = {
+            'content edit': (lambda: post.save(), False),
+            'bulk published': (lambda: BlogPost.objects.filter(pk=post.pk).update(status='published'), True),
+            'published edit': (lambda: BlogPost.objects.with_content().get(pk=post.pk).save(), False),
+            'tag added': (lambda: post.tags.add(self.tag), True),
+            'unpublished': (lambda: self.set_status(post, 'draft'), True),
+        }
+        for name, (change, invalidated) in changes.items():
+            with self.subTest(change=name):
+                version = cache.get(home_cache.version_key('popular_tags'), 0)
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                bumped = cache.get(home_cache.version_key('popular_tags'), 0) != version
+                self.assertEqual(bumped, invalidated)
+
+    def set_status(self, post, status):
+        post = BlogPost.objects.with_content().get(pk=post.pk)
+        post.status = status
+        post.save()
+
+
+class TagPopularityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('ranker')
+        cls.tags = [Tag.objects.create(name=name) for name in ('avl', 'b-tree', 'splay')]
+        avl, btree, splay = cls.tags
+        for title, status, views, tags in [
+            ('Rotations', 'published', 40, [avl, btree]),
+            ('Balancing', 'published', 3, [avl]),
+            ('Pages', 'published', 0, [btree]),
+            ('Zig-zag', 'draft', 500, [avl, splay]),
+        ]:
+            post = make_post(cls.author, title, status=status, views_count=views)
+            post.tags.set(tags)
+
+    def expected(self):
+        """The ranking inputs aggregated straight from the published posts"""
+        published = Q(posts__status='published')
+        return {
+            tag.pk: (tag.post_count, tag.total_views or 0)
+            for tag in Tag.objects.annotate(
+                post_count=Count('posts', filter=published),
+                total_views=Sum('posts__views_count', filter=published),
+            ) if tag.post_count
+        }
+
+    def rows(self):
+        return {row.tag_id: (row.post_count, row.total_views) for row in TagPopularity.objects.all()}
+
+    def test_refresh_matches_direct_aggregate(self):
+        self.assertEqual(refresh_tag_popularity(), (2, 0, 0))
+        self.assertEqual(self.rows(), self.expected())
+        self.assertEqual(self.rows(), {self.tags[0].pk: (2, 43), self.tags[1].pk: (2, 40)})
+        for row in TagPopularity.objects.all():
+            self.assertAlmostEqual(row.score, popularity_score(row.post_count, row.total_views))
+        self.assertEqual(refresh_tag_popularity(), (0, 0, 0))
+
+    def test_unpublished_posts_are_excluded(self):
+        refresh_tag_popularity()
+        self.assertNotIn(self.tags[2].pk, self.rows())
+
+        BlogPost.objects.filter(title='Zig-zag').update(status='published')
+        BlogPost.objects.filter(title='Pages').update(status='draft')
+        self.assertEqual(refresh_tag_popularity(), (1, 2, 0))
+        self.assertEqual(self.rows(), self.expected())
+
+        BlogPost.objects.filter(title='Zig-zag').update(status='draft')
+        self.assertEqual(refresh_tag_popularity(), (0, 1, 1))
+        self.assertEqual(self.rows(), self.expected())
+        self.assertEqual([tag.name for tag in popular_tags()], ['avl', 'b-tree'])
+
+
+class RenderCacheTests(TestCase):
+    """content_html is re-rendered only when the content hash changes"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('renderer')
+        self.post = make_post(self.author, 'Hashing', content='Open **addressing**')
+
+    def test_content_edit_rerenders(self):
+        self.assertIn('<strong>addressing</strong>', self.post.content_html)
+        post = BlogPost.objects.with_content().get(pk=self.post.pk)
+        post.content = 'Separate *chaining*'
+        post.save()
+
+        post = BlogPost.objects.with_content().get(pk=self.post.pk)
+        self.assertIn('<em>chaining</em>', post.content_html)
+        self.assertNotIn('addressing', post.content_html)
+        self.assertEqual(post.content_hash, post.get_content_hash())
+        self.assertEqual(post.plain_text, 'Separate chaining')
+
+    def test_unchanged_save_hits_cache(self):
+        post = BlogPost.objects.with_content().get(pk=self.post.pk)
+        with mock.patch('blog.models.markdownify') as markdownify:
+            post.title = 'Hashing, revisited'
+            post.save()
+            post.save(update_fields=['content'])
+            html = BlogPost.objects.with_content().get(pk=self.post.pk).get_markdown_content()
+        markdownify.assert_not_called()
+        self.assertIn('<strong>addressing</strong>', html)
+
+
+class DeferredBodyTests(TestCase):
+    """Listings leave the post bodies in the database; the detail page loads them with the row"""
+
+    body_columns = [f'"blog_blogpost"."{name}"' for name in BlogPost.objects.body_fields]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('deferrer', password='pw')
+        cls.category = Category.objects.create(name='Heaps')
+        cls.tag = Tag.objects.create(name='binary-heap')
+        cls.posts = [make_post(cls.author, f'Heap post {i}', category=cls.category) for i in range(3)]
+        for post in cls.posts:
+            post.tags.add(cls.tag)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('blog.views.view_counter')
+        patcher.start().increment.return_value = 0
+        self.addCleanup(patcher.stop)
+
+    def body_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries if any(column in query['sql'] for column in self.body_columns)]
+
+    def test_listings_do_not_select_bodies(self):
+        self.client.force_login(self.author)
+        for name, args, params in [
+            ('blog:home', [], None),
+            ('blog:post_list', [], None),
+            ('blog:category_posts', [self.category.slug], None),
+            ('blog:tag_posts', [self.tag.slug], None),
+            ('blog:search', [], {'q': 'heap'}),
+            ('blog:my_posts', [], None),
+        ]:
+            with self.subTest(view=name):
+                self.assertEqual(self.body_queries(reverse(name, args=args), params), [])
+
+    def test_detail_loads_bodies_in_one_query(self):
+        queries = self.body_queries(reverse('blog:post_detail', args=[self.posts[0].slug]))
+        self.assertEqual(len(queries), 1)
+        for column in self.body_columns:
+            self.assertIn(column, queries[0])
+        # Fetched together with the row and its select_related joins, not lazily afterwards
+        self.assertIn('"blog_category"', queries[0])
+
+
+class MigrationBackfillTests(TestCase):
+    """The data migrations, run on their historical models, match the live rebuilds"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.other_author = User.objects.create_user('migrator'), User.objects.create_user('migrator2')
+        categories = [Category.objects.create(name=name) for name in ('Graphs', 'Strings')]
+        tags = [Tag.objects.create(name=name) for name in ('dijkstra', 'kmp', 'z-function')]
+        for i in range(8):
+            post = make_post(
+                cls.author if i % 3 else cls.other_author, f'Migrated {i}', status='draft' if i == 5 else 'published',
+                content=f'# Part {i}\n\nSome `code` and [a link](https://example.com) ' * (i + 1),
+                category=categories[i % 2] if i != 6 else None, views_count=i * 10,
+                published_at=timezone.now() - timedelta(days=i * 20))
+            post.tags.set(tags[:i % 4])
+            Comment.objects.create(post=post, author=cls.author, content='Nice', is_approved=i % 2 == 0)
+
+    def backfill(self, migration, function):
+        apps = MigrationLoader(connection).project_state(('blog', migration)).apps
+        getattr(import_module(f'blog.migrations.{migration}'), function)(apps, None)
+
+    def test_text_stats(self):
+        expected = list(BlogPost.objects.with_content().values_list('plain_text', 'word_count', 'reading_minutes'))
+        BlogPost.objects.update(plain_text='', word_count=0, reading_minutes=1)
+        self.backfill('0005_backfill_blogpost_text_stats', 'backfill_text_stats')
+        self.assertEqual(
+            list(BlogPost.objects.with_content().values_list('plain_text', 'word_count', 'reading_minutes')), expected)
+
+    def test_counters(self):
+        def counters():
+            return (
+                list(Category.objects.values_list('pk', 'published_post_count')),
+                list(Tag.objects.values_list('pk', 'published_post_count')),
+                list(AuthorStats.objects.order_by('pk').values_list('pk', 'published_post_count')),
+                list(BlogPost.objects.values_list('pk', 'approved_comment_count')),
+            )
+        recount_all()
+        expected = counters()
+        Category.objects.update(published_post_count=0)
+        Tag.objects.update(published_post_count=0)
+        BlogPost.objects.update(approved_comment_count=0)
+        AuthorStats.objects.all().delete()
+        self.backfill('0007_denormalized_counters', 'backfill_counters')
+        self.assertEqual(counters(), expected)
+
+    def test_tag_popularity(self):
+        def rows():
+            return [(row.tag_id, row.post_count, row.total_views, round(row.score, 9))
+                    for row in TagPopularity.objects.order_by('tag_id')]
+        self.backfill('0008_tag_popularity', 'populate_tag_popularity')
+        backfilled = rows()
+        TagPopularity.objects.all().delete()
+        refresh_tag_popularity()
+        self.assertEqual(backfilled, rows())
+        self.assertTrue(backfilled)
+
+    def test_related_posts(self):
+        def rows():
+            return [(row.post_id, row.rank, row.related_id, round(row.score, 9))
+                    for row in RelatedPost.objects.order_by('post_id', 'rank')]
+        RelatedPost.objects.all().delete()
+        self.backfill('0009_related_posts', 'build_related_posts')
+        backfilled = rows()
+        rebuild_related_posts()
+        self.assertEqual(backfilled, rows())
+        self.assertTrue(backfilled)
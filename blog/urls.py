@@ -18,10 +18,12 @@ urlpatterns = [
     
     # Comments
     path('<slug:slug>/comment/', views.add_comment, name='add_comment'),
+    path('<slug:slug>/comments/', views.comment_list, name='comment_list'),
     
     # Categories and Tags
     path('category/<slug:slug>/', views.category_posts, name='category_posts'),
     path('tag/<slug:slug>/', views.tag_posts, name='tag_posts'),
+    path('tags/cloud/', views.tag_cloud, name='tag_cloud'),
     
     # Markdown Guide
 ]
\ No newline at end of file
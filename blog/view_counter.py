@@ -0,0 +1,132 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    """
+    Accumulates post view increments in memory and writes them in batches.
+
+    post_detail used to do a read-modify-write save() on every GET. Instead,
+    increments are summed per post here and flushed periodically as
+    `views_count = views_count + n` UPDATEs, grouping posts that share the
+    same n into a single query.
+
+    Requests flush when the buffer is due, and a background thread flushes
+    every flush_interval so an idle worker doesn't sit on its views. A
+    failed flush keeps the views buffered for the next attempt.
+    """
+
+    def __init__(self, flush_interval=10, max_pending=1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._counts = defaultdict(int)
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+
+    def increment(self, post_id, n=1):
+        """Record n views of post_id, flushing if the buffer is due. Returns views not yet written for post_id"""
+        with self._lock:
+            self._counts[post_id] += n
+            self._pending += n
+            pending_for_post = self._counts[post_id]
+            due = (self._pending >= self.max_pending
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+            self._start_flusher()
+        if due:
+            self.try_flush()
+        return pending_for_post
+
+    def try_flush(self):
+        """flush() for request and background paths: never blocks on another flush, never raises"""
+        try:
+            return self.flush(blocking=False)
+        except Exception:
+            logger.exception('Could not write buffered post views; keeping them for the next flush')
+            return 0
+
+    def _start_flusher(self):
+        # Called with self._lock held. The pid check restarts the thread in forked workers
+        if self._flusher is not None and self._flusher_pid == os.getpid() and self._flusher.is_alive():
+            return
+        self._flusher = threading.Thread(target=self._flush_periodically, name='view-count-flusher', daemon=True)
+        self._flusher_pid = os.getpid()
+        self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                idle = not self._pending
+            if idle:
+                continue
+            self.try_flush()
+            # This thread's connection would otherwise stay open between flushes
+            connections.close_all()
+
+    def pending(self, post_id):
+        with self._lock:
+            return self._counts.get(post_id, 0)
+
+    def flush(self, blocking=True):
+        """Write all buffered increments to the database. Returns the number of views written"""
+        # Only one thread writes at a time; others keep buffering meanwhile
+        if not self._flush_lock.acquire(blocking=blocking):
+            return 0
+        try:
+            with self._lock:
+                counts, self._counts = self._counts, defaultdict(int)
+                self._pending = 0
+                self._last_flush = time.monotonic()
+            if not counts:
+                return 0
+            try:
+                self._write(counts)
+            except Exception:
+                # Put the increments back so a failed flush does not lose views
+                with self._lock:
+                    for post_id, n in counts.items():
+                        self._counts[post_id] += n
+                        self._pending += n
+                raise
+            return sum(counts.values())
+        finally:
+            self._flush_lock.release()
+
+    def _write(self, counts):
+        from .models import BlogPost
+
+        by_increment = defaultdict(list)
+        for post_id, n in counts.items():
+            by_increment[n].append(post_id)
+        # All or nothing, so a retry after a failure never double-counts
+        with transaction.atomic():
+            for n, post_ids in by_increment.items():
+                BlogPost.objects.filter(id__in=post_ids).update(views_count=F('views_count') + n)
+
+
+view_counter = ViewCountBuffer(
+    flush_interval=getattr(settings, 'BLOG_VIEW_COUNT_FLUSH_INTERVAL', 10),
+    max_pending=getattr(settings, 'BLOG_VIEW_COUNT_MAX_PENDING', 1000),
+)
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        pass
@@ -2,44 +2,41 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.db.models import Q
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.text import slugify
 from django.utils import timezone
-from .models import BlogPost, Category, Tag, Comment
+from django.utils.dateformat import format as format_date
+from .models import LIST_VERSION_KEY, BlogPost, Category, Tag, Comment
 from .forms import BlogPostForm, CommentForm
+from .view_counter import view_counter
+from .search import get_search_backend
+from .comments import get_comment_page, get_first_page
+from . import home_cache
+from .popularity import popular_tags
+from resource.pagination import InvalidCursor
+from base.conditional import cache_version, make_etag, not_modified, queryset_version, set_validators
 
 
 def blog_home(request):
     """Blog home page with featured posts and recent posts"""
-    featured_posts = BlogPost.objects.filter(status='published', is_featured=True)[:3]
-    recent_posts = BlogPost.objects.filter(status='published').exclude(is_featured=True)[:6]
-    categories = Category.objects.annotate(post_count=Count('posts')).filter(post_count__gt=0)[:10]
-    popular_tags = Tag.objects.annotate(post_count=Count('posts')).filter(post_count__gt=0)[:15]
+    posts = BlogPost.objects.published().for_listing()
     
-    context = {
-        'featured_posts': featured_posts,
-        'recent_posts': recent_posts,
-        'categories': categories,
-        'popular_tags': popular_tags,
-    }
+    # Each fragment is cached until a post, category or tag change invalidates it
+    context = home_cache.get_fragments({
+        'featured_posts': lambda: list(posts.filter(is_featured=True)[:3]),
+        'recent_posts': lambda: list(posts.exclude(is_featured=True)[:6]),
+        'categories': lambda: list(Category.objects.filter(published_post_count__gt=0)[:10]),
+        'popular_tags': lambda: list(popular_tags(15)),
+    })
     return render(request, 'blog/home.html', context)
 
 
 def post_list(request):
     """List all published posts with pagination and filtering"""
-    posts = BlogPost.objects.filter(status='published')
-    
-    # Search functionality
-    search_query = request.GET.get('search')
-    if search_query:
-        posts = posts.filter(
-            Q(title__icontains=search_query) |
-            Q(content__icontains=search_query) |
-            Q(excerpt__icontains=search_query)
-        )
+    posts = BlogPost.objects.published().for_listing()
     
     # Category filter
     category_slug = request.GET.get('category')
@@ -51,6 +48,11 @@ def post_list(request):
     if tag_slug:
         posts = posts.filter(tags__slug=tag_slug)
     
+    # Search functionality (applied last, it may return ranked results rather than a queryset)
+    search_query = request.GET.get('search')
+    if search_query:
+        posts = get_search_backend().search(posts, search_query)
+    
     # Pagination
     paginator = Paginator(posts, 9)  # 9 posts per page
     page_number = request.GET.get('page')
@@ -67,20 +69,30 @@ def post_list(request):
 
 def post_detail(request, slug):
     """Individual blog post detail page"""
-    post = get_object_or_404(BlogPost, slug=slug, status='published')
+    post_id, updated_at, comment_count = get_object_or_404(
+        BlogPost.objects.published().values_list('id', 'updated_at', 'approved_comment_count'), slug=slug)
+    
+    # Increment view count (buffered, written in batches); a revalidated view still counts
+    pending_views = view_counter.increment(post_id)
+    
+    # Answer conditional GETs before loading the post, comments and related posts
+    etag = make_etag('post', post_id, updated_at.isoformat(), comment_count, cache_version(LIST_VERSION_KEY),
+                     request.user.pk)
+    response = not_modified(request, etag, updated_at)
+    if response:
+        return response
     
-    # Increment view count
-    post.views_count += 1
-    post.save(update_fields=['views_count'])
+    post = get_object_or_404(
+        BlogPost.objects.with_content().select_related('author__blog_stats', 'category'), id=post_id)
+    post.views_count += pending_views
     
-    # Get comments
-    comments = post.comments.filter(is_approved=True, parent=None).prefetch_related('replies')
+    # Get comments: only the first page of threads, replies load on demand
+    comments, comments_next = get_first_page(post)
     
-    # Related posts
-    related_posts = BlogPost.objects.filter(
-        status='published',
-        category=post.category
-    ).exclude(id=post.id)[:3]
+    # Related posts: precomputed neighbors, see blog.related
+    related_posts = BlogPost.objects.published().filter(
+        related_entries__post=post
+    ).order_by('related_entries__rank')[:3]
     
     # Comment form
     comment_form = CommentForm()
@@ -88,10 +100,12 @@ def post_detail(request, slug):
     context = {
         'post': post,
         'comments': comments,
+        'comments_next': comments_next,
+        'comment_count': post.approved_comment_count,
         'related_posts': related_posts,
         'comment_form': comment_form,
     }
-    return render(request, 'blog/post_detail.html', context)
+    return set_validators(render(request, 'blog/post_detail.html', context), etag, updated_at)
 
 
 @login_required(login_url='login')
@@ -119,7 +133,7 @@ def post_create(request):
 @login_required(login_url='login')
 def post_edit(request, slug):
     """Edit an existing blog post"""
-    post = get_object_or_404(BlogPost, slug=slug)
+    post = get_object_or_404(BlogPost.objects.with_content(), slug=slug)
     
     # Check if user is the author or has permission
     if post.author != request.user and not request.user.is_staff:
@@ -164,7 +178,7 @@ def post_delete(request, slug):
 @login_required(login_url='login')
 def my_posts(request):
     """User's own blog posts"""
-    posts = BlogPost.objects.filter(author=request.user)
+    posts = BlogPost.objects.filter(author=request.user).select_related('category')
     
     # Filter by status
     status_filter = request.GET.get('status')
@@ -185,7 +199,16 @@ def my_posts(request):
 def category_posts(request, slug):
     """Posts by category"""
     category = get_object_or_404(Category, slug=slug)
-    posts = BlogPost.objects.filter(category=category, status='published')
+    posts = BlogPost.objects.published().filter(category=category)
+    
+    count, latest = queryset_version(posts)
+    etag = make_etag('category', category.pk, category.name, category.description, count, latest,
+                     cache_version(LIST_VERSION_KEY), request.GET.get('page'), request.user.pk)
+    response = not_modified(request, etag, latest)
+    if response:
+        return response
+    
+    posts = posts.for_listing()
     
     paginator = Paginator(posts, 9)
     page_number = request.GET.get('page')
@@ -195,13 +218,22 @@ def category_posts(request, slug):
         'category': category,
         'page_obj': page_obj,
     }
-    return render(request, 'blog/category_posts.html', context)
+    return set_validators(render(request, 'blog/category_posts.html', context), etag, latest)
 
 
 def tag_posts(request, slug):
     """Posts by tag"""
     tag = get_object_or_404(Tag, slug=slug)
-    posts = BlogPost.objects.filter(tags=tag, status='published')
+    posts = BlogPost.objects.published().filter(tags=tag)
+    
+    count, latest = queryset_version(posts)
+    etag = make_etag('tag', tag.pk, tag.name, count, latest, cache_version(LIST_VERSION_KEY),
+                     request.GET.get('page'), request.user.pk)
+    response = not_modified(request, etag, latest)
+    if response:
+        return response
+    
+    posts = posts.for_listing()
     
     paginator = Paginator(posts, 9)
     page_number = request.GET.get('page')
@@ -211,7 +243,7 @@ def tag_posts(request, slug):
         'tag': tag,
         'page_obj': page_obj,
     }
-    return render(request, 'blog/tag_posts.html', context)
+    return set_validators(render(request, 'blog/tag_posts.html', context), etag, latest)
 
 
 @login_required(login_url='login')
@@ -229,7 +261,10 @@ def add_comment(request, slug):
         # Handle reply to another comment
         parent_id = request.POST.get('parent_id')
         if parent_id:
-            comment.parent = get_object_or_404(Comment, id=parent_id)
+            try:
+                comment.parent = get_object_or_404(Comment, id=int(parent_id))
+            except ValueError:
+                return HttpResponseBadRequest('Invalid parent')
         
         comment.save()
         messages.success(request, 'Your comment has been added!')
@@ -239,18 +274,82 @@ def add_comment(request, slug):
     return redirect('blog:post_detail', slug=slug)
 
 
+def _comment_data(comment):
+    """JSON for a comment; replies come with their subtree under 'replies'"""
+    data = {
+        'id': comment.id,
+        'parent_id': comment.parent_id,
+        'author': comment.author.username,
+        'content': comment.content,
+        'created_at': format_date(timezone.localtime(comment.created_at), 'M d, Y H:i'),
+    }
+    if hasattr(comment, 'children'):
+        data['reply_count'] = len(comment.children)
+        data['replies'] = [_comment_data(child) for child in comment.children]
+    else:
+        data['reply_count'] = comment.reply_count
+    return data
+
+
+def comment_list(request, slug):
+    """API endpoint for a page of comment threads, or of reply subtrees with ?parent=<id>"""
+    post = get_object_or_404(BlogPost.objects.only('id', 'slug'), slug=slug, status='published')
+    parent_id = request.GET.get('parent')
+    try:
+        # int() rather than isdigit(), which also accepts digits such as '²' that int() rejects
+        parent_id = int(parent_id) if parent_id else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid parent'}, status=400)
+
+    try:
+        comments, next_cursor = get_comment_page(post, parent_id=parent_id, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'status': 'error', 'message': 'Invalid cursor'}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'comments': [_comment_data(comment) for comment in comments],
+        'next': next_cursor,
+    })
+
+
+def tag_cloud(request):
+    """API endpoint for the most popular tags, weighted 1-5 for a tag cloud"""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 50)), 200))
+    except ValueError:
+        limit = 50
+
+    tags = list(popular_tags(limit))
+    scores = [tag.popularity.score for tag in tags]
+    low, high = (min(scores), max(scores)) if scores else (0, 0)
+
+    tags_data = []
+    for tag in tags:
+        score = tag.popularity.score
+        tags_data.append({
+            'name': tag.name,
+            'slug': tag.slug,
+            'url': tag.get_absolute_url(),
+            'post_count': tag.popularity.post_count,
+            'score': round(score, 3),
+            'weight': 1 + round(4 * (score - low) / (high - low)) if high > low else 3,
+        })
+
+    return JsonResponse({
+        'status': 'success',
+        'tags': tags_data,
+    })
+
+
 def search_posts(request):
     """Search blog posts"""
     query = request.GET.get('q', '')
     posts = BlogPost.objects.none()
     
     if query:
-        posts = BlogPost.objects.filter(
-            Q(title__icontains=query) |
-            Q(content__icontains=query) |
-            Q(excerpt__icontains=query),
-            status='published'
-        ).distinct()
+        posts = get_search_backend().search(
+            BlogPost.objects.published().for_listing(), query)
     
     paginator = Paginator(posts, 9)
     page_number = request.GET.get('page')
@@ -259,7 +358,7 @@ def search_posts(request):
     context = {
         'page_obj': page_obj,
         'query': query,
-        'total_results': posts.count(),
+        'total_results': paginator.count,
     }
     return render(request, 'blog/search_results.html', context)
 
@@ -1,8 +1,22 @@
 from django.contrib import admin
-from .models import Resource,Tag,Cource,Session,Subject
+from .models import Resource,Tag,Cource,Session,Subject,StoredBlob
 from base.models import Notification
 # Register your models here.
-admin.site.register(Resource)
+
+@admin.register(Resource)
+class ResourceAdmin(admin.ModelAdmin):
+    list_display = ['name', 'course', 'subject', 'session', 'semester', 'created_by', 'created_at']
+    list_filter = ['course', 'semester', 'session']
+    search_fields = ['name', 'description']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_related()
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'ref_count', 'updated_at']
+    readonly_fields = ['name', 'sha256', 'size', 'ref_count']
+
 admin.site.register(Tag)
 admin.site.register(Cource)
 admin.site.register(Session)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ResourceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'resource'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the blob reference counting)
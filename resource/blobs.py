@@ -0,0 +1,137 @@
+import os
+import shutil
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Resource, StoredBlob
+from .storage import digest_from_name, file_digest, get_resource_storage
+
+# A blob left without references is only deleted after this long, so an
+# upload that just found it already stored can still take a reference
+GC_GRACE_PERIOD = timedelta(hours=1)
+
+
+def acquire_blob(name):
+    """Count one more Resource using the stored file `name`"""
+    digest = digest_from_name(name)
+    if not digest:
+        return
+    with transaction.atomic():
+        blob, _ = StoredBlob.objects.select_for_update().get_or_create(
+            name=name, defaults={'sha256': digest, 'size': get_resource_storage().size(name)})
+        StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+
+def release_blob(name):
+    """Count one Resource fewer; the file stays until collect_garbage"""
+    if digest_from_name(name):
+        StoredBlob.objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=F('ref_count') - 1, updated_at=timezone.now())
+
+
+def recount_blobs():
+    """Reset every ref_count from the Resource rows. Returns how many blobs changed"""
+    storage = get_resource_storage()
+    counts = dict(Resource.objects.exclude(file='').exclude(file__isnull=True)
+                  .order_by().values('file').annotate(n=Count('id')).values_list('file', 'n'))
+    tracked = set(StoredBlob.objects.values_list('name', flat=True))
+    untracked = [
+        StoredBlob(name=name, sha256=digest_from_name(name), size=storage.size(name), ref_count=n)
+        for name, n in counts.items()
+        if name not in tracked and digest_from_name(name) and storage.exists(name)
+    ]
+    StoredBlob.objects.bulk_create(untracked, ignore_conflicts=True)
+    changed = len(untracked)
+    for blob in StoredBlob.objects.only('id', 'name', 'ref_count').iterator():
+        actual = counts.get(blob.name, 0)
+        if blob.ref_count != actual:
+            StoredBlob.objects.filter(pk=blob.pk).update(ref_count=actual, updated_at=timezone.now())
+            changed += 1
+    return changed
+
+
+def collect_garbage(grace=GC_GRACE_PERIOD):
+    """Delete blobs nobody has referenced or reused for `grace`. Returns (count, bytes freed)"""
+    storage = get_resource_storage()
+    cutoff = timezone.now() - grace
+    count = freed = 0
+    candidates = StoredBlob.objects.filter(ref_count=0, updated_at__lt=cutoff).values_list('pk', flat=True)
+    for pk in list(candidates):
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(
+                pk=pk, ref_count=0, updated_at__lt=cutoff).first()
+            if blob is None:
+                continue
+            # The storage touches a file whenever an upload reuses it
+            if storage.exists(blob.name) and os.path.getmtime(storage.path(blob.name)) > time.time() - grace.total_seconds():
+                continue
+            storage.delete(blob.name)
+            blob.delete()
+            count += 1
+            freed += blob.size
+    return count, freed
+
+
+def _link(source, target):
+    """Put `source` at `target` too, as a hard link when the filesystem allows it"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def dedupe_legacy_files(dry_run=False):
+    """
+    Move Resource files saved before content addressing into blob storage.
+
+    The first file with a given content becomes its blob, the rows using
+    any copy are pointed at it and the copies deleted. Files no row uses
+    are left alone. Returns
+    (files examined, duplicates removed, bytes freed).
+    """
+    storage = get_resource_storage()
+    rows_by_name = defaultdict(list)
+    for pk, name in Resource.objects.exclude(file='').exclude(file__isnull=True).values_list('pk', 'file').iterator():
+        if not digest_from_name(name):
+            rows_by_name[name].append(pk)
+
+    files = duplicates = freed = 0
+    stored = set()
+    for name, pks in rows_by_name.items():
+        if not storage.exists(name):
+            continue
+        with storage.open(name) as f:
+            blob = storage.blob_name(name, file_digest(f))
+        files += 1
+        if blob in stored or storage.exists(blob):
+            duplicates += 1
+            freed += storage.size(name)
+        stored.add(blob)
+        if dry_run:
+            continue
+        if not storage.exists(blob):
+            _link(storage.path(name), storage.path(blob))
+        # Saving through the model keeps ref_count in step via the signals
+        for resource in Resource.objects.filter(pk__in=pks).only('pk', 'file'):
+            resource.file.name = blob
+            resource.save(update_fields=['file'])
+        storage.delete(name)
+    return files, duplicates, freed
+
+
+def unreferenced_legacy_files(directory='resources'):
+    """Names of files directly in `directory` that no Resource uses; left for an admin to review"""
+    storage = get_resource_storage()
+    if not storage.exists(directory):
+        return []
+    referenced = set(Resource.objects.filter(file__startswith=f'{directory}/').values_list('file', flat=True))
+    return [f'{directory}/{filename}' for filename in storage.listdir(directory)[1]
+            if f'{directory}/{filename}' not in referenced]
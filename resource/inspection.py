@@ -0,0 +1,184 @@
+"""
+Identify an uploaded file from its bytes instead of the client's content type.
+
+Only bounded reads are made, whatever the file size: the first HEAD_SIZE
+bytes, plus for zip containers the end-of-central-directory record and
+at most CENTRAL_DIRECTORY_LIMIT bytes of the directory it points to, and
+for OLE (legacy Office) files their first directory sectors.
+"""
+import struct
+from typing import NamedTuple
+
+HEAD_SIZE = 8 * 1024
+# The end-of-central-directory record may be followed by a comment of up to 64KB
+ZIP_TAIL_SIZE = 22 + 0xFFFF
+CENTRAL_DIRECTORY_LIMIT = 256 * 1024
+OLE_DIRECTORY_LIMIT = 16 * 1024
+
+ZIP_MAGIC = (b'PK\x03\x04', b'PK\x05\x06')
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+RAR_MAGIC = (b'Rar!\x1a\x07\x00', b'Rar!\x1a\x07\x01\x00')
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+
+
+class FileFormat(NamedTuple):
+    mime: str
+    resource_type: str  # a RESOURCE_TYPE key
+
+
+PDF = FileFormat('application/pdf', 'pdf')
+DOC = FileFormat('application/msword', 'doc')
+XLS = FileFormat('application/vnd.ms-excel', 'xls')
+PPT = FileFormat('application/vnd.ms-powerpoint', 'ppt')
+DOCX = FileFormat('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'docx')
+XLSX = FileFormat('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')
+PPTX = FileFormat('application/vnd.openxmlformats-officedocument.presentationml.presentation', 'ppt')
+ZIP = FileFormat('application/zip', 'zip')
+RAR = FileFormat('application/vnd.rar', 'rar')
+MP4 = FileFormat('video/mp4', 'video')
+MOV = FileFormat('video/quicktime', 'video')
+WEBM = FileFormat('video/webm', 'video')
+
+FORMATS = {fmt.mime: fmt for fmt in (PDF, DOC, XLS, PPT, DOCX, XLSX, PPTX, ZIP, RAR, MP4, MOV, WEBM)}
+# Other names browsers send for the same formats
+MIME_ALIASES = {
+    'application/x-zip-compressed': ZIP.mime,
+    'application/x-rar-compressed': RAR.mime,
+    'application/x-rar': RAR.mime,
+}
+# Claims that carry no information; the bytes decide
+GENERIC_TYPES = {'', 'application/octet-stream'}
+
+# Part directories that identify an OOXML package
+OOXML_PARTS = {'word/': DOCX, 'xl/': XLSX, 'ppt/': PPTX}
+# Stream names that identify an OLE compound document
+OLE_STREAMS = {'WordDocument': DOC, 'Workbook': XLS, 'Book': XLS, 'PowerPoint Document': PPT}
+OLE_FORMATS = (DOC, XLS, PPT)
+# An OLE container whose main stream wasn't found in the directory sectors read
+OLE_UNKNOWN = FileFormat('application/x-ole-storage', 'other')
+
+
+def _read_at(f, offset, size):
+    f.seek(offset)
+    return f.read(size)
+
+
+def _size(f):
+    return f.seek(0, 2)
+
+
+def _zip_names(f, head):
+    """Entry names from the central directory, or from the local headers in `head` if it can't be found"""
+    size = _size(f)
+    tail_start = max(0, size - ZIP_TAIL_SIZE)
+    tail = _read_at(f, tail_start, ZIP_TAIL_SIZE)
+    end = tail.rfind(b'PK\x05\x06')
+    if end != -1 and len(tail) - end >= 22:
+        directory_size, directory_offset = struct.unpack_from('<II', tail, end + 12)
+        if directory_offset + directory_size <= tail_start + end:
+            directory = _read_at(f, directory_offset, min(directory_size, CENTRAL_DIRECTORY_LIMIT))
+            return _entry_names(directory, b'PK\x01\x02', 46, 28)
+    return _entry_names(head, b'PK\x03\x04', 30, 26)
+
+
+def _entry_names(data, signature, header_size, lengths_at):
+    """Walk consecutive zip headers; `lengths_at` is where the name/extra(/comment) lengths start"""
+    names, position = [], 0
+    while data.startswith(signature, position) and position + header_size <= len(data):
+        lengths = struct.unpack_from('<HHH' if signature == b'PK\x01\x02' else '<HH', data, position + lengths_at)
+        name_start = position + header_size
+        names.append(data[name_start:name_start + lengths[0]].decode('utf-8', 'replace'))
+        if signature == b'PK\x03\x04':
+            # Local headers are followed by the compressed data
+            compressed_size = struct.unpack_from('<I', data, position + 18)[0]
+            position = name_start + sum(lengths) + compressed_size
+        else:
+            position = name_start + sum(lengths)
+    return names
+
+
+def _sniff_zip(f, head):
+    names = _zip_names(f, head)
+    if '[Content_Types].xml' in names:
+        for name in names:
+            for prefix, fmt in OOXML_PARTS.items():
+                if name.startswith(prefix):
+                    return fmt
+    return ZIP
+
+
+def _sniff_ole(f, head):
+    """Look the document's main stream up in the OLE directory; None if it isn't in the first sectors"""
+    if len(head) < 512:
+        return None
+    sector_shift = struct.unpack_from('<H', head, 30)[0]
+    directory_sector = struct.unpack_from('<I', head, 48)[0]
+    if not 7 <= sector_shift <= 16:
+        return None
+    directory = _read_at(f, (directory_sector + 1) << sector_shift, OLE_DIRECTORY_LIMIT)
+    for position in range(0, len(directory) - 127, 128):
+        name_length = struct.unpack_from('<H', directory, position + 64)[0]
+        name = directory[position:position + max(0, min(name_length, 64) - 2)].decode('utf-16-le', 'replace')
+        if name in OLE_STREAMS:
+            return OLE_STREAMS[name]
+    return None
+
+
+def _sniff_video(head):
+    if head[4:8] == b'ftyp':
+        return MOV if head[8:12] == b'qt  ' else MP4
+    if head.startswith(EBML_MAGIC) and b'\x42\x82' in head[:64] and b'webm' in head[:64]:
+        return WEBM
+    return None
+
+
+def recognizes(head):
+    """Whether the first bytes of a file start a format we can identify"""
+    return (head.startswith(ZIP_MAGIC + RAR_MAGIC + (OLE_MAGIC,)) or b'%PDF-' in head[:1024]
+            or _sniff_video(head) is not None)
+
+
+def sniff(f):
+    """
+    Detected FileFormat of a seekable binary file, or None if unknown.
+
+    An OLE file whose main stream can't be located is reported as
+    OLE_UNKNOWN so the caller can fall back to the claim.
+    """
+    f.seek(0)
+    head = f.read(HEAD_SIZE)
+    try:
+        if head.startswith(ZIP_MAGIC):
+            return _sniff_zip(f, head)
+        if head.startswith(OLE_MAGIC):
+            return _sniff_ole(f, head) or OLE_UNKNOWN
+        if head.startswith(RAR_MAGIC):
+            return RAR
+        # The PDF header may follow a little leading garbage
+        if b'%PDF-' in head[:1024]:
+            return PDF
+        return _sniff_video(head)
+    finally:
+        f.seek(0)
+
+
+def identify(f, claimed_type=''):
+    """
+    (FileFormat, None) for a file whose bytes are a known format consistent
+    with `claimed_type`, else (None, reason).
+    """
+    claimed_type = MIME_ALIASES.get(claimed_type, claimed_type)
+    detected = sniff(f)
+    if detected is None:
+        return None, 'Unrecognised file format. Please upload a supported format.'
+    if detected is OLE_UNKNOWN:
+        # A legacy Office container we couldn't look inside: trust the claim if it names one
+        if claimed_type in FORMATS and FORMATS[claimed_type] in OLE_FORMATS:
+            return FORMATS[claimed_type], None
+        return None, 'Unrecognised Office document. Please upload a supported format.'
+    if claimed_type in GENERIC_TYPES or claimed_type == detected.mime:
+        return detected, None
+    # An Office Open XML file is also a valid zip
+    if claimed_type == ZIP.mime and detected in OOXML_PARTS.values():
+        return detected, None
+    return None, f'The file content ({detected.mime}) does not match its type ({claimed_type}).'
@@ -0,0 +1,124 @@
+from django.core.management.base import BaseCommand
+from resource.inspection import identify
+import os
+import statistics
+import struct
+import tempfile
+import time
+
+
+class CountingReader:
+    """Binary file wrapper that counts the bytes read through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        return self.f.seek(offset, whence)
+
+
+class Command(BaseCommand):
+    help = 'Time file-type inspection on generated files of growing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[1, 100, 1000],
+            help='File sizes in MB to benchmark (default: 1 100 1000)')
+        parser.add_argument('--repeat', type=int, default=20, help='Inspections per file (default: 20)')
+
+    def handle(self, *args, **options):
+        # Files are sparse, so even the largest take no time or disk to create
+        writers = [
+            ('pdf', 'application/pdf', self.write_pdf),
+            ('docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', self.write_docx),
+            ('doc', 'application/msword', self.write_doc),
+            ('rar', 'application/vnd.rar', self.write_rar),
+            ('mp4', 'video/mp4', self.write_mp4),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            for size_mb in sorted(options['sizes']):
+                size = size_mb * 1024 * 1024
+                for name, claimed_type, write in writers:
+                    path = os.path.join(directory, f'{size_mb}mb.{name}')
+                    write(path, size)
+                    timings, bytes_read, detected = [], 0, None
+                    with open(path, 'rb') as f:
+                        for _ in range(options['repeat']):
+                            reader = CountingReader(f)
+                            start = time.perf_counter()
+                            detected, _reason = identify(reader, claimed_type)
+                            timings.append(time.perf_counter() - start)
+                            bytes_read = reader.bytes_read
+                    full_read = self.time_full_read(path)
+                    self.stdout.write(
+                        f'{size_mb:>6} MB {name:<5} -> {detected.resource_type if detected else "rejected":<6} '
+                        f'inspect {statistics.median(timings) * 1000:7.3f}ms  read {bytes_read / 1024:7.1f}KB  '
+                        f'(full read {full_read * 1000:9.1f}ms)')
+                    os.remove(path)
+
+    def time_full_read(self, path):
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            while f.read(64 * 1024):
+                pass
+        return time.perf_counter() - start
+
+    def write_sparse(self, path, head, size, tail=b''):
+        with open(path, 'wb') as f:
+            f.write(head)
+            f.seek(size - len(tail))
+            f.write(tail)
+            f.truncate(size)
+
+    def write_pdf(self, path, size):
+        self.write_sparse(path, b'%PDF-1.7\n', size, b'\n%%EOF\n')
+
+    def write_rar(self, path, size):
+        self.write_sparse(path, b'Rar!\x1a\x07\x01\x00', size)
+
+    def write_mp4(self, path, size):
+        self.write_sparse(path, struct.pack('>I', 24) + b'ftypisom\x00\x00\x02\x00isomiso2', size)
+
+    def write_doc(self, path, size):
+        # OLE header (512-byte sectors, directory in sector 0) and a directory naming WordDocument
+        header = bytearray(512)
+        header[:8] = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+        struct.pack_into('<HH', header, 26, 3, 0xFFFE)
+        struct.pack_into('<H', header, 30, 9)
+        struct.pack_into('<I', header, 48, 0)
+        entry = bytearray(128)
+        name = 'WordDocument'.encode('utf-16-le')
+        entry[:len(name)] = name
+        struct.pack_into('<H', entry, 64, len(name) + 2)
+        self.write_sparse(path, bytes(header) + bytes(entry), size)
+
+    def write_docx(self, path, size):
+        """A stored-entry zip whose large media part is a hole in the file"""
+        small = [('[Content_Types].xml', b'<?xml version="1.0"?><Types/>'), ('word/document.xml', b'<w:document/>')]
+        big_name = b'word/media/lecture.bin'
+        central, offset = [], 0
+        with open(path, 'wb') as f:
+            for name, data in small:
+                central.append((name.encode(), len(data), offset))
+                f.write(self.local_header(name.encode(), len(data)) + name.encode() + data)
+                offset = f.tell()
+            big_size = max(0, size - offset - 30 - len(big_name) - 200)
+            central.append((big_name, big_size, offset))
+            f.write(self.local_header(big_name, big_size) + big_name)
+            f.seek(big_size, 1)
+            directory_offset = f.tell()
+            for name, length, local_offset in central:
+                f.write(struct.pack('<4sHHHHHHIIIHHHHHII', b'PK\x01\x02', 20, 20, 0, 0, 0, 0x21, 0,
+                                    length, length, len(name), 0, 0, 0, 0, 0, local_offset) + name)
+            directory_size = f.tell() - directory_offset
+            f.write(struct.pack('<4sHHHHIIH', b'PK\x05\x06', 0, 0, len(central), len(central),
+                                directory_size, directory_offset, 0))
+
+    def local_header(self, name, length):
+        return struct.pack('<4sHHHHHIIIHH', b'PK\x03\x04', 20, 0, 0, 0, 0x21, 0, length, length, len(name), 0)
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from resource.models import Resource, Tag, Cource, Subject, Session
+from resource.serializer import ResourceSerializer, FastResourceSerializer
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare ResourceSerializer with FastResourceSerializer on generated data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[1000, 10000, 100000],
+            help='Row counts to benchmark (default: 1000 10000 100000)')
+
+    def handle(self, *args, **options):
+        # Everything is created inside a transaction that is rolled back,
+        # so the benchmark never leaves rows behind.
+        with transaction.atomic():
+            user = User.objects.create(username='serializer-benchmark', first_name='Bench', last_name='Mark')
+            course = Cource.objects.create(name='Benchmark Course')
+            subject = Subject.objects.create(name='Benchmark Subject', course=course)
+            session = Session.objects.create(name='Benchmark Session')
+            tags = [Tag.objects.create(name=f'benchmark-{i}') for i in range(3)]
+
+            created = 0
+            for size in sorted(options['sizes']):
+                self.create_resources(size - created, user, course, subject, session, tags)
+                created = size
+                resources = Resource.objects.filter(course=course)
+
+                model_time = self.time(lambda: ResourceSerializer(resources.with_related(), many=True).data)
+                fast_time = self.time(lambda: FastResourceSerializer(FastResourceSerializer.get_queryset(resources)).data)
+                self.stdout.write(
+                    f'{size:>7} rows: model {model_time:8.3f}s  fast {fast_time:8.3f}s  '
+                    f'speedup {model_time / fast_time:5.1f}x')
+
+            transaction.set_rollback(True)
+
+    def create_resources(self, count, user, course, subject, session, tags):
+        resources = Resource.objects.bulk_create([
+            Resource(name=f'Benchmark resource {i}', description='Generated for benchmarking',
+                     created_by=user, course=course, subject=subject, session=session)
+            for i in range(count)
+        ], batch_size=1000)
+        Through = Resource.tags.through
+        Through.objects.bulk_create([
+            Through(resource_id=resource.id, tag_id=tag.id)
+            for resource in resources for tag in tags
+        ], batch_size=1000)
+
+    def time(self, func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
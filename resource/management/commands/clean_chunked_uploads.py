@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from resource.uploads import clean_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads (and their staging files) that were abandoned'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=24,
+            help='Remove uploads untouched for this many hours')
+
+    def handle(self, *args, **options):
+        removed = clean_stale_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} stale upload(s)'))
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+from resource.blobs import collect_garbage, dedupe_legacy_files, recount_blobs, unreferenced_legacy_files
+
+
+class Command(BaseCommand):
+    help = 'Move resource files into content-addressed storage, merging duplicates, and delete unused blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without touching files')
+        parser.add_argument(
+            '--grace-hours', type=int, default=1,
+            help='Keep unreferenced blobs this many hours before deleting them')
+
+    def handle(self, *args, **options):
+        files, duplicates, freed = dedupe_legacy_files(dry_run=options['dry_run'])
+        verb = 'Would free' if options['dry_run'] else 'Freed'
+        self.stdout.write(
+            f'{files} legacy file(s) examined, {duplicates} duplicate(s). {verb} {filesizeformat(freed)}')
+        orphans = unreferenced_legacy_files()
+        if orphans:
+            self.stdout.write(self.style.WARNING(
+                f'{len(orphans)} file(s) in resources/ are not used by any resource and were left in place'))
+        if options['dry_run']:
+            return
+
+        changed = recount_blobs()
+        if changed:
+            self.stdout.write(self.style.WARNING(f'Repaired the reference count of {changed} blob(s)'))
+        removed, collected = collect_garbage(timedelta(hours=options['grace_hours']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {removed} unreferenced blob(s), {filesizeformat(collected)}'))
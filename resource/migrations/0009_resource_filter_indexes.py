@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resource', '0008_alter_subject_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['-created_at', '-id'], name='resource_created_07c33c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['course', 'semester', '-created_at', '-id'], name='resource_course__448a03_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['subject', '-created_at', '-id'], name='resource_subject_681287_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['session', '-created_at', '-id'], name='resource_session_096958_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['semester', '-created_at', '-id'], name='resource_semeste_76952e_idx'),
+        ),
+    ]
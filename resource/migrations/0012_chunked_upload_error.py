@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resource', '0011_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
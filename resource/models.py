@@ -1,6 +1,7 @@
 from django.db import models
 from base.models import BaseModel
 from base.choices import RESOURCE_CATEGORY,RESOURCE_TYPE,SEMESTER_CHOICE
+from .storage import get_resource_storage
 
 # Create your models here.
 
@@ -38,10 +39,19 @@ class Tag(BaseModel):
         db_table = 'tag'
 
 
+class ResourceQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join the FK lookups and batch-load tags used by ResourceSerializer"""
+        return self.select_related(
+            'course', 'subject', 'session', 'created_by'
+        ).prefetch_related('tags')
+
+
 class Resource(BaseModel):
     name = models.CharField(max_length=255)
     description = models.TextField(null=True,blank=True)
-    file = models.FileField(upload_to='resources/', blank=True, null=True)
+    # Content-addressed: identical uploads share one stored file (see StoredBlob)
+    file = models.FileField(upload_to='resources/', storage=get_resource_storage, blank=True, null=True)
     url = models.URLField(max_length=255, blank=True, null=True)
     tags = models.ManyToManyField('Tag')
     created_by = models.ForeignKey('auth.User', on_delete=models.CASCADE)
@@ -51,6 +61,8 @@ class Resource(BaseModel):
     semester = models.CharField(max_length=255, choices=SEMESTER_CHOICE, default='1')
     subject = models.ForeignKey('Subject', on_delete=models.CASCADE)
     session = models.ForeignKey('Session', on_delete=models.CASCADE)
+
+    objects = ResourceQuerySet.as_manager()
     
     def __str__(self):
         return self.name
@@ -58,5 +70,58 @@ class Resource(BaseModel):
     class Meta:
         db_table = 'resource'
         ordering = ['-created_at']
+        # Match ListResourcesAPIView: any mix of course/subject/session/semester
+        # filters, newest first with id as the keyset tiebreaker
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['course', 'semester', '-created_at', '-id']),
+            models.Index(fields=['subject', '-created_at', '-id']),
+            models.Index(fields=['session', '-created_at', '-id']),
+            models.Index(fields=['semester', '-created_at', '-id']),
+        ]
+
+
+
+
+class ChunkedUpload(BaseModel):
+    """A file arriving in chunks; bytes [0, offset) are in the staging file so far"""
+    created_by = models.ForeignKey('auth.User', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    # Client-supplied SHA-256, checked once the last chunk arrives
+    expected_sha256 = models.CharField(max_length=64, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Why verification of the received file failed, for the client polling its status
+    error = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.offset}/{self.size})'
+
+    class Meta:
+        db_table = 'chunked_upload'
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+    @property
+    def is_verifying(self):
+        """Every byte is staged; the checksum and format check are still running"""
+        return self.offset == self.size and self.completed_at is None and not self.error
 
 
+class StoredBlob(BaseModel):
+    """A content-addressed file in resource storage and how many Resource rows use it"""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} refs)'
+
+    class Meta:
+        db_table = 'stored_blob'
@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(created_at, pk, reverse=False):
+    """Encode a (created_at, id) position into an opaque url-safe token"""
+    payload = json.dumps([created_at.isoformat(), pk, int(reverse)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a token produced by encode_cursor back into (created_at, id, reverse)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk, reverse = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(pk), bool(reverse)
+    except (TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+
+class KeysetPaginator:
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Each page is fetched with a range condition on the ordering columns
+    instead of an OFFSET, so the cost of a page does not grow with how
+    deep the client has scrolled.
+    """
+    default_page_size = 20
+    max_page_size = 100
+
+    def __init__(self, queryset, page_size=None):
+        self.queryset = queryset
+        self.page_size = self.get_page_size(page_size)
+
+    def get_page_size(self, page_size):
+        try:
+            page_size = int(page_size)
+        except (TypeError, ValueError):
+            return self.default_page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate(self, cursor=None):
+        """Return (rows, next_cursor, previous_cursor) for the page at cursor"""
+        queryset = self.queryset
+        reverse = False
+        if cursor:
+            created_at, pk, reverse = decode_cursor(cursor)
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+
+        # Fetch one extra row to know whether there is another page
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if not rows:
+            return rows, None, None
+
+        first, last = rows[0], rows[-1]
+        if reverse:
+            next_cursor = encode_cursor(last.created_at, last.id)
+            previous_cursor = encode_cursor(first.created_at, first.id, reverse=True) if has_more else None
+        else:
+            next_cursor = encode_cursor(last.created_at, last.id) if has_more else None
+            previous_cursor = encode_cursor(first.created_at, first.id, reverse=True) if cursor else None
+        return rows, next_cursor, previous_cursor
+
+    def iter_pages(self):
+        """Yield every page in order, one bounded query per page"""
+        cursor = None
+        while True:
+            rows, cursor, _ = self.paginate(cursor)
+            if rows:
+                yield rows
+            if not cursor:
+                return
+
+
+class ExportPaginator(KeysetPaginator):
+    """Larger pages for walking a whole queryset in bounded chunks"""
+    default_page_size = 2000
+    max_page_size = 2000
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.db.models import F
 from .models import Resource,Tag
 
 class TagsSerializer(serializers.ModelSerializer):
@@ -15,3 +16,69 @@ class ResourceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Resource
         exclude = ['id','updated_at']
+
+
+class FastResourceSerializer:
+    """
+    Serialize resources straight from values_list() rows.
+
+    Produces the same output as ResourceSerializer, but skips model and
+    serializer field instantiation per row, which dominates CPU time on
+    large listings.
+    """
+    value_fields = (
+        'id', 'uid', 'created_at', 'name', 'description', 'file', 'url',
+        'category', 'type', 'semester', 'subject_name', 'course_name',
+        'session_name', 'creator_first_name', 'creator_last_name',
+        # Not serialized; validates cursor pages in ListResourcesAPIView
+        'updated_at',
+    )
+    tag_batch_size = 500
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def get_queryset(cls, queryset):
+        """Turn a Resource queryset into named value rows for this serializer"""
+        return queryset.annotate(
+            subject_name=F('subject__name'),
+            course_name=F('course__name'),
+            session_name=F('session__name'),
+            creator_first_name=F('created_by__first_name'),
+            creator_last_name=F('created_by__last_name'),
+        ).values_list(*cls.value_fields, named=True)
+
+    def get_tags(self, ids):
+        """Map resource id -> list of tag names, fetched in batches"""
+        tags = {}
+        through = Resource.tags.through.objects
+        for start in range(0, len(ids), self.tag_batch_size):
+            batch = ids[start:start + self.tag_batch_size]
+            for resource_id, tag_name in through.filter(
+                    resource_id__in=batch).order_by('id').values_list('resource_id', 'tag__name'):
+                tags.setdefault(resource_id, []).append({'name': tag_name})
+        return tags
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        tags = self.get_tags([row.id for row in rows])
+        storage = Resource._meta.get_field('file').storage
+        created_at = serializers.DateTimeField()
+        return [{
+            'subject': row.subject_name,
+            'course': row.course_name,
+            'session': row.session_name,
+            'created_by': f'{row.creator_first_name} {row.creator_last_name}'.strip(),
+            'tags': tags.get(row.id, []),
+            'uid': str(row.uid),
+            'created_at': created_at.to_representation(row.created_at),
+            'name': row.name,
+            'description': row.description,
+            'file': storage.url(row.file) if row.file else None,
+            'url': row.url,
+            'category': row.category,
+            'type': row.type,
+            'semester': row.semester,
+        } for row in rows]
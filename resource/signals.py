@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from base.conditional import bump_cache_version
+from .blobs import acquire_blob, release_blob
+from .models import Cource, Resource, Session, Subject, Tag
+
+# Part of the resource list ETag: changes the list shows that don't touch a
+# Resource row (its tags, or the names of its course, subject, session,
+# tags and creator)
+LIST_VERSION_KEY = 'resource:list-version'
+LISTED_FIELDS = {'name', 'first_name', 'last_name'}
+
+# Keep StoredBlob.ref_count in step with the Resource rows pointing at each
+# stored file. dedupe_resource_files --recount repairs drift.
+
+
+@receiver(pre_save, sender=Resource)
+def remember_file(sender, instance, raw, update_fields=None, **kwargs):
+    instance._previous_file = None
+    if instance.pk and not instance._state.adding and (update_fields is None or 'file' in update_fields):
+        instance._previous_file = Resource._base_manager.filter(pk=instance.pk).values_list(
+            'file', flat=True).first() or ''
+
+
+@receiver(post_save, sender=Resource)
+def count_file_reference(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    previous = '' if created else getattr(instance, '_previous_file', None)
+    current = instance.file.name or ''
+    if previous is None or previous == current:
+        return
+    if current:
+        acquire_blob(current)
+    if previous:
+        release_blob(previous)
+
+
+@receiver(post_delete, sender=Resource)
+def release_file_reference(sender, instance, **kwargs):
+    if instance.file.name:
+        release_blob(instance.file.name)
+
+
+@receiver(m2m_changed, sender=Resource.tags.through)
+def resource_tags_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_cache_version(LIST_VERSION_KEY)
+
+
+def listed_name_changed(sender, update_fields=None, **kwargs):
+    # Skip saves that can't change a listed name, such as the last_login update on every login
+    if update_fields is None or LISTED_FIELDS & set(update_fields):
+        bump_cache_version(LIST_VERSION_KEY)
+
+
+for model in (Cource, Subject, Session, Tag, User):
+    post_save.connect(listed_name_changed, sender=model, dispatch_uid=f'resource-list-version-save-{model.__name__}')
+    post_delete.connect(listed_name_changed, sender=model, dispatch_uid=f'resource-list-version-delete-{model.__name__}')
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import re
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.module_loading import import_string
+
+# <upload dir>/<first two hex digits>/<sha256><ext>
+BLOB_NAME = re.compile(r'/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(\.\w+)?$')
+
+
+def file_digest(content):
+    """SHA-256 of a Django File, read chunk by chunk"""
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def digest_from_name(name):
+    """The SHA-256 in a content-addressed file name, or None for any other name"""
+    match = BLOB_NAME.search(name or '')
+    return match.group('sha256') if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct file once, named by the SHA-256 of its content.
+
+    Saving content that is already stored writes nothing and returns the
+    existing name, so any number of rows can point at one file.
+    StoredBlob counts those rows; unreferenced files are removed by
+    dedupe_resource_files.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save, and an existing file is reused, never renamed
+        return name
+
+    def blob_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return '/'.join(filter(None, [directory, digest[:2], digest + extension]))
+
+    def _save(self, name, content):
+        # Chunked uploads already know their digest; anything else is hashed before writing
+        digest = getattr(content, 'sha256', '') or file_digest(content)
+        name = self.blob_name(name, digest)
+        path = self.path(name)
+        if os.path.exists(path):
+            # Mark the file as just reused so garbage collection leaves it alone
+            os.utime(path)
+            return name
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                file_move_safe(content.temporary_file_path(), temp_path)
+            else:
+                with open(temp_path, 'wb') as f:
+                    for chunk in content.chunks():
+                        f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            # Atomic, and harmless if a concurrent save of the same content got there first
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+
+@lru_cache(maxsize=None)
+def get_resource_storage():
+    """Storage for Resource.file, from settings.RESOURCE_FILE_STORAGE"""
+    return import_string(getattr(settings, 'RESOURCE_FILE_STORAGE', 'resource.storage.ContentAddressedStorage'))()
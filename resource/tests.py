@@ -1,3 +1,389 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import time
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from . import inspection, uploads
+from .blobs import collect_garbage, dedupe_legacy_files
+from .models import Cource, Resource, Session, StoredBlob, Subject, Tag
+from .serializer import FastResourceSerializer, ResourceSerializer
+from .storage import get_resource_storage
+from .views import resolve_uid
+
+
+def make_resources(n, **kwargs):
+    """n resources sharing one course, subject, session, creator and two tags"""
+    user = User.objects.create_user(f'creator{User.objects.count()}', first_name='Ada', last_name='Lovelace')
+    course = Cource.objects.create(name='BSc CS')
+    subject = Subject.objects.create(name='Algorithms', course=course)
+    session = Session.objects.create(name='2025-26')
+    tags = [Tag.objects.create(name='graphs'), Tag.objects.create(name='exam')]
+    resources = [Resource.objects.create(name=f'Notes {i}', created_by=user, course=course, subject=subject,
+                                         session=session, **kwargs) for i in range(n)]
+    for resource in resources:
+        resource.tags.set(tags)
+    return resources
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        staging = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        patcher = mock.patch.object(uploads, 'STAGING_DIR', staging.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('uploader')
+        self.content = b'%PDF-1.7\n' + bytes(range(256)) * 100 + b'\n%%EOF\n'
+
+    def send(self, upload, offset, data):
+        return uploads.append_chunk(upload, offset, io.BytesIO(data), len(data))
+
+    def test_last_chunk_hands_verification_off(self):
+        upload = uploads.start_upload(self.user, 'notes.pdf', len(self.content), 'application/pdf',
+                                      hashlib.sha256(self.content).hexdigest())
+        with mock.patch.object(uploads, 'start_verification') as start:
+            for offset in range(0, len(self.content), 4096):
+                upload = self.send(upload, offset, self.content[offset:offset + 4096])
+        start.assert_called_once()
+        self.assertTrue(upload.is_verifying)
+        self.assertFalse(upload.is_complete)
+
+        uploads.verify_upload(upload)
+        upload.refresh_from_db()
+        self.assertTrue(upload.is_complete)
+        self.assertEqual(upload.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(upload.content_type, 'application/pdf')
+        with open(uploads.staging_path(upload), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        # Verifying again (a status poll after a restart) changes nothing
+        completed_at = upload.completed_at
+        uploads.verify_upload(upload)
+        upload.refresh_from_db()
+        self.assertEqual(upload.completed_at, completed_at)
+
+    def test_verification_skips_while_another_holds_the_lock(self):
+        if not uploads.fcntl:
+            self.skipTest('no cross-process file lock on this platform')
+        upload = uploads.start_upload(self.user, 'notes.pdf', len(self.content), 'application/pdf')
+        with mock.patch.object(uploads, 'start_verification'):
+            upload = self.send(upload, 0, self.content)
+        with open(uploads.staging_path(upload), 'rb') as f:
+            uploads.fcntl.flock(f.fileno(), uploads.fcntl.LOCK_EX)
+            uploads.verify_upload(upload)
+        upload.refresh_from_db()
+        self.assertTrue(upload.is_verifying)
+
+    def test_unsupported_file_is_never_marked_complete(self):
+        content = b'#!/bin/sh\necho hi\n'
+        upload = uploads.start_upload(self.user, 'notes.pdf', len(content), '')
+        with mock.patch.object(uploads, 'start_verification', uploads.verify_upload):
+            self.send(upload, 0, content)
+        upload.refresh_from_db()
+        self.assertFalse(upload.is_complete)
+        self.assertIn('Unrecognised', upload.error)
+
+    def test_retried_chunk_is_told_where_to_resume(self):
+        upload = uploads.start_upload(self.user, 'notes.pdf', len(self.content), 'application/pdf')
+        self.send(upload, 0, self.content[:4096])
+        with self.assertRaises(uploads.OffsetMismatch) as caught:
+            self.send(upload, 0, self.content[:4096])
+        self.assertEqual(caught.exception.offset, 4096)
+
+    def test_checksum_mismatch_restarts_the_upload(self):
+        upload = uploads.start_upload(self.user, 'notes.pdf', len(self.content), 'application/pdf', '0' * 64)
+        with mock.patch.object(uploads, 'start_verification', uploads.verify_upload):
+            self.send(upload, 0, self.content)
+        upload.refresh_from_db()
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(upload.error, 'Checksum mismatch, upload restarted')
+        with open(uploads.staging_path(upload), 'rb') as f:
+            self.assertEqual(f.read(), b'')
+        # Sending the file again clears the failure
+        with mock.patch.object(uploads, 'start_verification'):
+            upload = self.send(upload, 0, self.content[:4096])
+        self.assertEqual(upload.error, '')
+
+
+class ResourceListValidatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.resources = make_resources(5)
+
+    def setUp(self):
+        self.url = reverse('list-resources')
+
+    def test_cursor_pages_do_not_aggregate_the_filtered_set(self):
+        for params in ({'page_size': 2}, {'page_size': 2, 'export': 'ndjson'}):
+            with self.subTest(params=params), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url, params)
+                if params.get('export'):
+                    b''.join(response.streaming_content)
+            self.assertFalse([q for q in queries if 'MAX(' in q['sql'].upper()])
+
+    def test_page_etag_revalidates(self):
+        params = {'page_size': 2, 'serializer': 'fast'}
+        etag = self.client.get(self.url, params)['ETag']
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_related_changes_move_the_etag(self):
+        resource = self.resources[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            extra_tags = iter([Tag.objects.create(name=f'extra {i}') for i in range(2)])
+        changes = [
+            lambda: resource.tags.add(next(extra_tags)),
+            lambda: Tag.objects.get(name='exam').save(),
+            lambda: Subject.objects.get(pk=resource.subject_id).save(update_fields=['name']),
+            lambda: User.objects.filter(pk=resource.created_by_id).get().save(update_fields=['first_name']),
+        ]
+        for params in ({}, {'page_size': 2}):
+            for change in changes:
+                with self.subTest(params=params, change=changes.index(change)):
+                    before = self.client.get(self.url, params)['ETag']
+                    with self.captureOnCommitCallbacks(execute=True):
+                        change()
+                    self.assertNotEqual(self.client.get(self.url, params)['ETag'], before)
+
+    def test_login_does_not_move_the_etag(self):
+        user = User.objects.get(pk=self.resources[0].created_by_id)
+        before = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(self.url)['ETag'], before)
+
+
+class FastSerializerTests(TestCase):
+    """FastResourceSerializer emits exactly what ResourceSerializer does"""
+
+    def test_matches_model_serializer(self):
+        with_tags, untagged, bare, nameless = make_resources(4, description='Week 3', url='https://example.com')
+        untagged.tags.clear()
+        Resource.objects.filter(pk=with_tags.pk).update(file='resources/notes.pdf')
+        # Every nullable column empty
+        Resource.objects.filter(pk=bare.pk).update(description=None, url=None, file=None)
+        nameless.created_by = User.objects.create_user('anonymous')
+        nameless.save()
+
+        resources = Resource.objects.order_by('-created_at', '-id')
+        expected = ResourceSerializer(resources.with_related(), many=True).data
+        actual = FastResourceSerializer(FastResourceSerializer.get_queryset(resources)).data
+        self.assertEqual(len(actual), 4)
+        for fast, model in zip(actual, expected):
+            with self.subTest(resource=model['name']):
+                # Same JSON byte for byte, key order included
+                self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(model))
+
+        by_name = {item['name']: item for item in actual}
+        self.assertEqual(by_name['Notes 0']['tags'], [{'name': 'graphs'}, {'name': 'exam'}])
+        self.assertEqual(by_name['Notes 1']['tags'], [])
+        self.assertEqual(
+            [by_name['Notes 2'][field] for field in ('description', 'url', 'file')], [None, None, None])
+        self.assertEqual(by_name['Notes 3']['created_by'], '')
+
+
+class ResourceQueryCountTests(TestCase):
+    """Listings load relations in a fixed number of queries, whatever the row count"""
+
+    def setUp(self):
+        self.url = reverse('list-resources')
+        self.admin = User.objects.create_superuser('admin', password='pw')
+
+    def assertConstantQueries(self, num, request):
+        for n in (2, 10):
+            make_resources(n - Resource.objects.count())
+            with self.subTest(rows=n), self.assertNumQueries(num):
+                response = request()
+                self.assertEqual(response.status_code, 200)
+
+    def test_api_list_with_model_serializer(self):
+        # version aggregate, rows with their FK joins, tags
+        self.assertConstantQueries(3, lambda: self.client.get(self.url, {'serializer': 'model'}))
+
+    def test_api_list_with_fast_serializer(self):
+        self.assertConstantQueries(3, lambda: self.client.get(self.url, {'serializer': 'fast'}))
+
+    def test_api_page(self):
+        self.assertConstantQueries(2, lambda: self.client.get(self.url, {'page_size': 50}))
+
+    def test_admin_changelist(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:resource_resource_changelist')
+        self.client.get(url)  # warm the content types cache
+        self.assertConstantQueries(8, lambda: self.client.get(url))
+
+
+class ResourceIndexTests(TestCase):
+    """The list API's filters are answered from the composite indexes of migration 0009"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.resource = make_resources(3)[0]
+
+    def plan(self, **filters):
+        # The same shape as a keyset page of ListResourcesAPIView
+        queryset = Resource.objects.filter(**filters).order_by('-created_at', '-id')[:21]
+        return queryset.explain()
+
+    def test_filters_use_the_composite_indexes(self):
+        resource = self.resource
+        cases = [
+            ({}, 'resource_created_07c33c_idx'),
+            ({'course_id': resource.course_id, 'semester': '1'}, 'resource_course__448a03_idx'),
+            ({'subject_id': resource.subject_id}, 'resource_subject_681287_idx'),
+            ({'session_id': resource.session_id}, 'resource_session_096958_idx'),
+            ({'semester': '1'}, 'resource_semeste_76952e_idx'),
+        ]
+        for filters, index in cases:
+            with self.subTest(filters=filters):
+                plan = self.plan(**filters)
+                self.assertIn(index, plan)
+                # Rows come out of the index already ordered
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_resolve_uid_is_cached(self):
+        cache.clear()
+        course = Cource.objects.get(pk=self.resource.course_id)
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_uid(Cource, course.uid), course.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_uid(Cource, str(course.uid)), course.pk)
+
+
+class StoredBlobTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = get_resource_storage()
+        self.first, self.second = make_resources(2)
+
+    def attach(self, resource, content, filename='notes.pdf'):
+        resource.file.save(filename, ContentFile(content))
+        return resource.file.name
+
+    def ref_count(self, name):
+        return StoredBlob.objects.get(name=name).ref_count
+
+    def test_reference_counts(self):
+        shared = self.attach(self.first, b'same bytes')
+        self.assertEqual(self.attach(self.second, b'same bytes', 'copy.pdf'), shared)
+        self.assertEqual(self.ref_count(shared), 2)
+
+        replacement = self.attach(self.second, b'other bytes')
+        self.assertEqual(self.ref_count(shared), 1)
+        self.assertEqual(self.ref_count(replacement), 1)
+
+        self.first.delete()
+        self.assertEqual(self.ref_count(shared), 0)
+        # Released, not deleted: collect_garbage removes it after the grace period
+        self.assertTrue(self.storage.exists(shared))
+
+    def test_collect_garbage_removes_only_old_unreferenced_blobs(self):
+        referenced = self.attach(self.first, b'in use')
+        old = self.attach(self.second, b'old orphan')
+        recent = self.attach(self.second, b'recent orphan')
+        self.second.delete()
+        grace = timedelta(hours=1)
+        long_ago = time.time() - 2 * grace.total_seconds()
+        StoredBlob.objects.exclude(name=recent).update(updated_at=timezone.now() - 2 * grace)
+        for name in (referenced, old):
+            os.utime(self.storage.path(name), (long_ago, long_ago))
+
+        self.assertEqual(collect_garbage(grace), (1, len(b'old orphan')))
+        self.assertFalse(self.storage.exists(old))
+        self.assertFalse(StoredBlob.objects.filter(name=old).exists())
+        for name in (referenced, recent):
+            self.assertTrue(self.storage.exists(name))
+            self.assertTrue(StoredBlob.objects.filter(name=name).exists())
+
+    def test_dedupe_legacy_files(self):
+        for resource, name in ((self.first, 'resources/a.pdf'), (self.second, 'resources/b.pdf')):
+            os.makedirs(os.path.dirname(self.storage.path(name)), exist_ok=True)
+            with open(self.storage.path(name), 'wb') as f:
+                f.write(b'legacy bytes')
+            Resource.objects.filter(pk=resource.pk).update(file=name)
+
+        self.assertEqual(dedupe_legacy_files(), (2, 1, len(b'legacy bytes')))
+        names = set(Resource.objects.filter(pk__in=[self.first.pk, self.second.pk]).values_list('file', flat=True))
+        self.assertEqual(len(names), 1)
+        blob = names.pop()
+        self.assertEqual(self.ref_count(blob), 2)
+        self.assertTrue(self.storage.exists(blob))
+        self.assertFalse(self.storage.exists('resources/a.pdf'))
+        self.assertFalse(self.storage.exists('resources/b.pdf'))
+
+
+class InspectionTests(SimpleTestCase):
+    def zip_bytes(self, *names):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name in names:
+                archive.writestr(name, b'<x/>')
+        return buffer.getvalue()
+
+    def ole_bytes(self, stream_name):
+        # 512-byte sectors, directory in sector 0 (right after the header)
+        header = bytearray(512)
+        header[:8] = inspection.OLE_MAGIC
+        struct.pack_into('<H', header, 30, 9)
+        struct.pack_into('<I', header, 48, 0)
+        entry = bytearray(128)
+        name = stream_name.encode('utf-16-le')
+        entry[:len(name)] = name
+        struct.pack_into('<H', entry, 64, len(name) + 2)
+        return bytes(header) + bytes(entry)
+
+    def identify(self, data, claimed_type=''):
+        return inspection.identify(io.BytesIO(data), claimed_type)
+
+    def test_sniff(self):
+        cases = [
+            (b'%PDF-1.7\n...\n%%EOF\n', inspection.PDF),
+            (b'\x00\x00junk%PDF-1.4\n', inspection.PDF),
+            (self.zip_bytes('notes.txt'), inspection.ZIP),
+            (self.zip_bytes('[Content_Types].xml', 'word/document.xml'), inspection.DOCX),
+            (self.zip_bytes('[Content_Types].xml', 'xl/workbook.xml'), inspection.XLSX),
+            (self.ole_bytes('WordDocument'), inspection.DOC),
+            (self.ole_bytes('Workbook'), inspection.XLS),
+            (self.ole_bytes('Something Else'), inspection.OLE_UNKNOWN),
+            (b'Rar!\x1a\x07\x01\x00' + bytes(16), inspection.RAR),
+            (struct.pack('>I', 24) + b'ftypisom\x00\x00\x02\x00isomiso2', inspection.MP4),
+            (struct.pack('>I', 20) + b'ftypqt  \x00\x00\x02\x00qt  ', inspection.MOV),
+            (b'\x7fELF\x02\x01\x01' + bytes(64), None),
+            (b'', None),
+        ]
+        for data, expected in cases:
+            with self.subTest(data=data[:12]):
+                f = io.BytesIO(data)
+                self.assertEqual(inspection.sniff(f), expected)
+                self.assertEqual(f.tell(), 0)
+
+    def test_identify_checks_the_claim(self):
+        docx = self.zip_bytes('[Content_Types].xml', 'word/document.xml')
+        self.assertEqual(self.identify(docx, inspection.DOCX.mime), (inspection.DOCX, None))
+        # Any Office Open XML file is also a valid zip, and a generic claim defers to the bytes
+        self.assertEqual(self.identify(docx, 'application/x-zip-compressed'), (inspection.DOCX, None))
+        self.assertEqual(self.identify(docx, 'application/octet-stream'), (inspection.DOCX, None))
+        detected, reason = self.identify(b'%PDF-1.7\n', inspection.DOCX.mime)
+        self.assertIsNone(detected)
+        self.assertIn('does not match', reason)
+        self.assertEqual(self.identify(self.ole_bytes('Unknown'), inspection.PPT.mime), (inspection.PPT, None))
+        self.assertIsNone(self.identify(self.ole_bytes('Unknown'), inspection.PDF.mime)[0])
+        self.assertIsNone(self.identify(b'just some text')[0])
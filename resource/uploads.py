@@ -0,0 +1,243 @@
+import os
+import threading
+from datetime import timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, no cross-process lock
+    fcntl = None
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections
+from django.utils import timezone
+
+from .inspection import FORMATS, GENERIC_TYPES, HEAD_SIZE, MIME_ALIASES, identify, recognizes
+from .models import ChunkedUpload
+from .storage import file_digest
+
+CHUNK_SIZE = getattr(settings, 'RESOURCE_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+MAX_UPLOAD_SIZE = getattr(settings, 'RESOURCE_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024)
+STAGING_DIR = str(getattr(
+    settings, 'RESOURCE_UPLOAD_STAGING_DIR', os.path.join(settings.BASE_DIR, 'upload_staging')))
+# Bytes read from the request (or staging file) at a time
+READ_BLOCK = 64 * 1024
+
+# What the client may claim; the bytes are checked by inspection.identify
+ALLOWED_UPLOAD_TYPES = [*FORMATS, *MIME_ALIASES]
+
+
+class UploadError(Exception):
+    status = 400
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        if status:
+            self.status = status
+
+
+class UnsupportedFile(UploadError):
+    status = 415
+
+
+class OffsetMismatch(UploadError):
+    """The chunk doesn't start where the staged bytes end; the client should resume from `offset`"""
+    status = 409
+
+    def __init__(self, offset):
+        super().__init__(f'Expected a chunk at offset {offset}')
+        self.offset = offset
+
+
+class StagedFile(File):
+    """A staged upload that FileSystemStorage moves into place instead of copying"""
+
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def staging_path(upload):
+    return os.path.join(STAGING_DIR, f'{upload.uid.hex}.part')
+
+
+def inspect_upload(f, claimed_type=''):
+    """FileFormat of an uploaded file read from its first bytes; raises UnsupportedFile"""
+    detected, reason = identify(f, claimed_type)
+    if detected is None:
+        raise UnsupportedFile(reason)
+    return detected
+
+
+def start_upload(user, filename, size, content_type, sha256=''):
+    """Validate the announced file and create an empty staging file for it"""
+    # Browsers send no type for some formats (rar); those are sniffed once the bytes arrive
+    if content_type not in ALLOWED_UPLOAD_TYPES and content_type not in GENERIC_TYPES:
+        raise UploadError('Invalid file type. Please upload a supported format.')
+    if not 0 < size <= MAX_UPLOAD_SIZE:
+        raise UploadError(f'File size exceeds the maximum limit of {MAX_UPLOAD_SIZE // (1024 * 1024)}MB.')
+
+    upload = ChunkedUpload.objects.create(
+        created_by=user,
+        filename=os.path.basename(filename)[:255] or 'upload',
+        content_type=content_type,
+        size=size,
+        expected_sha256=sha256.lower(),
+    )
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    open(staging_path(upload), 'wb').close()
+    return upload
+
+
+def _locked(f, blocking=True):
+    """Take the exclusive lock on an open staging file; False if it is held and blocking is off"""
+    if not fcntl:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
+
+
+def append_chunk(upload, offset, stream, length):
+    """
+    Append `length` bytes read from `stream` at `offset`.
+
+    The chunk is copied in READ_BLOCK pieces, so memory per upload stays
+    bounded whatever the file size. A lock on the staging file serialises
+    retries of the same chunk; no database transaction is held while the
+    body streams in. Once the last chunk is staged the file is verified by
+    start_verification, off the request path.
+    """
+    if length <= 0 or length > CHUNK_SIZE:
+        raise UploadError(f'Chunks must be between 1 byte and {CHUNK_SIZE} bytes')
+
+    try:
+        f = open(staging_path(upload), 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Upload not found', status=404)
+    with f:
+        _locked(f)
+        # Read the row again: a request holding the lock before us may have moved the offset on
+        upload = ChunkedUpload.objects.filter(pk=upload.pk).first()
+        if upload is None:
+            raise UploadError('Upload not found', status=404)
+        if upload.is_complete:
+            raise UploadError('Upload already complete', status=409)
+        if offset != upload.offset:
+            raise OffsetMismatch(upload.offset)
+        if offset + length > upload.size:
+            raise UploadError('Chunk runs past the announced file size')
+
+        # Drop anything an interrupted earlier attempt left past the offset
+        f.seek(offset)
+        f.truncate()
+        received = 0
+        while received < length:
+            block = stream.read(min(READ_BLOCK, length - received))
+            if not block:
+                break
+            f.write(block)
+            received += len(block)
+        if received != length:
+            raise UploadError('Chunk ended early; resume from the current offset')
+        f.flush()
+
+        upload.offset += length
+        # A restart after a failed checksum clears the failure
+        upload.error = ''
+        upload.save(update_fields=['offset', 'error', 'updated_at'])
+
+    if upload.is_verifying:
+        start_verification(upload)
+    elif offset < HEAD_SIZE <= upload.offset:
+        # Turn away an unknown format after its first chunk, not after the whole file
+        with open(staging_path(upload), 'rb') as f:
+            if not recognizes(f.read(HEAD_SIZE)):
+                discard_upload(upload)
+                raise UnsupportedFile('Unrecognised file format. Please upload a supported format.')
+    return upload
+
+
+def start_verification(upload):
+    """Verify a fully staged upload in a background thread, so the last PUT returns at once"""
+    def run():
+        try:
+            verify_upload(upload)
+        finally:
+            connections.close_all()
+    threading.Thread(target=run, name=f'verify-upload-{upload.pk}', daemon=True).start()
+
+
+def verify_upload(upload):
+    """
+    Hash and inspect a fully staged upload, then mark it complete, or
+    record why not in `error`. The staged file is read once, whatever
+    worker received its chunks. Does nothing if another verification holds
+    the lock or the upload was already verified, so the status endpoint
+    may call it again for an upload a restart interrupted.
+    """
+    try:
+        f = open(staging_path(upload), 'r+b')
+    except FileNotFoundError:
+        return
+    with f:
+        if not _locked(f, blocking=False):
+            return
+        upload = ChunkedUpload.objects.filter(pk=upload.pk).first()
+        if upload is None or not upload.is_verifying:
+            return
+        digest = file_digest(File(f))
+        if upload.expected_sha256 and digest != upload.expected_sha256:
+            # Start over, keeping the row consistent with the emptied staging file
+            f.truncate(0)
+            upload.offset = 0
+            upload.error = 'Checksum mismatch, upload restarted'
+            upload.save(update_fields=['offset', 'error', 'updated_at'])
+            return
+        try:
+            detected = inspect_upload(f, upload.content_type)
+        except UnsupportedFile as e:
+            f.truncate(0)
+            upload.error = str(e)
+            upload.save(update_fields=['error', 'updated_at'])
+            return
+        # Saved together, so a completed upload always carries its sniffed type
+        upload.sha256 = digest
+        upload.content_type = detected.mime
+        upload.completed_at = timezone.now()
+        upload.save(update_fields=['sha256', 'content_type', 'completed_at', 'updated_at'])
+
+
+def attach_upload(upload, resource):
+    """Move a completed upload into resource.file and forget it"""
+    staged = StagedFile(staging_path(upload), upload.filename)
+    # Computed by verify_upload, so the storage doesn't hash the file again
+    staged.sha256 = upload.sha256
+    try:
+        resource.file.save(upload.filename, staged, save=False)
+    finally:
+        staged.close()
+    discard_upload(upload)
+
+
+def discard_upload(upload):
+    try:
+        os.remove(staging_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def clean_stale_uploads(max_age=timedelta(days=1)):
+    """Remove uploads (and staging files) untouched for max_age. Returns how many"""
+    stale = ChunkedUpload.objects.filter(updated_at__lt=timezone.now() - max_age)
+    count = 0
+    for upload in stale.iterator():
+        discard_upload(upload)
+        count += 1
+    return count
@@ -2,4 +2,7 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
+    # Chunked, resumable file uploads for upload_view
+    path('uploads/', views.start_chunked_upload, name='start_chunked_upload'),
+    path('uploads/<str:uid>/', views.chunked_upload, name='chunked_upload'),
 ]
@@ -1,31 +1,198 @@
+import json
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse, JsonResponse
+from django.views.decorators.http import require_POST
 from django.db.models import F
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .serializer import ResourceSerializer
-from .models import Resource
+from .serializer import ResourceSerializer, FastResourceSerializer
+from .models import Resource, Cource, Subject, Session, ChunkedUpload
+from .uploads import CHUNK_SIZE, OffsetMismatch, UploadError, append_chunk, start_upload, start_verification
+from .pagination import KeysetPaginator, ExportPaginator, InvalidCursor
+from base.conditional import cache_version, make_etag, not_modified, queryset_version, set_validators
+from .signals import LIST_VERSION_KEY
 from django.db.models import Q
 
 # Create your views here.
 
+UID_CACHE_TIMEOUT = 60 * 60
+
+
+def resolve_uid(model, uid):
+    """Map a public uid to its primary key, cached since uids never change"""
+    try:
+        uid = uuid.UUID(str(uid))
+    except ValueError:
+        return None
+    key = f'uid-pk:{model._meta.db_table}:{uid.hex}'
+    pk = cache.get(key)
+    if pk is None:
+        pk = model.objects.filter(uid=uid).values_list('id', flat=True).first()
+        if pk is not None:
+            cache.set(key, pk, UID_CACHE_TIMEOUT)
+    return pk
+
+
 class ListResourcesAPIView(APIView):
+    def use_fast_serializer(self, request):
+        """?serializer=fast|model overrides settings.RESOURCE_API_SERIALIZER"""
+        default = getattr(settings, 'RESOURCE_API_SERIALIZER', 'model')
+        return request.GET.get('serializer', default) == 'fast'
+
+    def export(self, resources):
+        """Stream resources as NDJSON, one resource per line"""
+        rows = FastResourceSerializer.get_queryset(resources)
+
+        def lines():
+            for page in ExportPaginator(rows).iter_pages():
+                for item in FastResourceSerializer(page).data:
+                    yield json.dumps(item) + '\n'
+
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="resources.ndjson"'
+        return response
+
     def get(self, request):
         course = request.GET.get('course')
         subject = request.GET.get('subject')
         session = request.GET.get('session')
         semester = request.GET.get('semester')
         resources = Resource.objects.all()
-        if course:
-            resources = resources.filter(course__uid=course)
-        if subject:
-            resources = resources.filter(subject__uid=subject)
-        if session:
-            resources = resources.filter(session__uid=session)
+        # Filter on the indexed FK columns instead of joining on uid
+        for model, field, uid in ((Cource, 'course_id', course),
+                                  (Subject, 'subject_id', subject),
+                                  (Session, 'session_id', session)):
+            if uid:
+                pk = resolve_uid(model, uid)
+                resources = resources.filter(**{field: pk}) if pk is not None else resources.none()
         if semester:
             resources = resources.filter(semester=semester)
-        serializer = ResourceSerializer(resources, many=True)
-        return Response({
+
+        # ?export=ndjson streams the whole filtered catalogue in bounded chunks
+        if request.GET.get('export') == 'ndjson':
+            return self.export(resources)
+
+        if self.use_fast_serializer(request):
+            resources = FastResourceSerializer.get_queryset(resources)
+            serialize = FastResourceSerializer
+        else:
+            resources = resources.with_related()
+            serialize = lambda rows: ResourceSerializer(rows, many=True)
+
+        # Opt-in keyset pagination: ?page_size=N and/or ?cursor=<token>
+        page_size = request.GET.get('page_size')
+        cursor = request.GET.get('cursor')
+        if page_size or cursor:
+            return self.page_response(request, resources, serialize, page_size, cursor)
+
+        # The filtered set's version decides the response; revalidate before serializing
+        count, latest = queryset_version(resources)
+        etag = make_etag('resources', count, latest, cache_version(LIST_VERSION_KEY), request.GET.urlencode())
+        response = not_modified(request, etag, latest)
+        if response:
+            return response
+        serializer = serialize(resources)
+        return set_validators(Response({
             'status': 200,
             'message': 'Resources fetched successfully',
             'data': serializer.data
-        })
\ No newline at end of file
+        }), etag, latest)
+
+    def page_response(self, request, resources, serialize, page_size, cursor):
+        paginator = KeysetPaginator(resources, page_size)
+        try:
+            resources, next_cursor, previous_cursor = paginator.paginate(cursor)
+        except InvalidCursor:
+            return Response({
+                'status': 400,
+                'message': 'Invalid cursor',
+            }, status=400)
+
+        # Validated by the page's own rows, so a page never aggregates over the whole filtered set.
+        # No Last-Modified: a row leaving the page would not move it
+        etag = make_etag('resources-page', cache_version(LIST_VERSION_KEY), request.GET.urlencode(),
+                         next_cursor, previous_cursor,
+                         *(f'{row.id}:{row.updated_at.isoformat()}' for row in resources))
+        response = not_modified(request, etag)
+        if response:
+            return response
+        serializer = serialize(resources)
+        return set_validators(Response({
+            'status': 200,
+            'message': 'Resources fetched successfully',
+            'data': serializer.data,
+            'next': next_cursor,
+            'previous': previous_cursor,
+        }), etag)
+
+def _upload_state(upload):
+    return {
+        'upload_id': upload.uid.hex,
+        'offset': upload.offset,
+        'size': upload.size,
+        'chunk_size': CHUNK_SIZE,
+        'complete': upload.is_complete,
+        'verifying': upload.is_verifying,
+        'error': upload.error,
+    }
+
+
+def _get_upload(request, uid):
+    try:
+        return ChunkedUpload.objects.get(uid=uuid.UUID(uid), created_by=request.user)
+    except (ValueError, ChunkedUpload.DoesNotExist):
+        return None
+
+
+@require_POST
+def start_chunked_upload(request):
+    """Announce a file ({filename, size, content_type, sha256?}) and get an upload id for its chunks"""
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Unauthorized'}, status=403)
+    try:
+        data = json.loads(request.body)
+        upload = start_upload(
+            request.user, str(data['filename']), int(data['size']),
+            str(data.get('content_type', '')), str(data.get('sha256', '')))
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    except UploadError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=e.status)
+    return JsonResponse({'status': 'success', **_upload_state(upload)}, status=201)
+
+
+def chunked_upload(request, uid):
+    """GET: where to resume. PUT ?offset=N with the raw chunk as body: append it"""
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Unauthorized'}, status=403)
+    upload = _get_upload(request, uid)
+    if upload is None:
+        return JsonResponse({'status': 'error', 'message': 'Upload not found'}, status=404)
+
+    if request.method == 'GET':
+        if upload.is_verifying:
+            # Picks verification back up if a restart cut it short; a no-op while it runs
+            start_verification(upload)
+        return JsonResponse({'status': 'success', **_upload_state(upload)})
+    if request.method != 'PUT':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    if upload.is_complete:
+        # A retried last chunk: nothing more to store
+        return JsonResponse({'status': 'success', **_upload_state(upload)})
+
+    try:
+        offset = int(request.GET.get('offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid offset'}, status=400)
+    try:
+        # Read the body as a stream: never more than one block of it in memory
+        upload = append_chunk(upload, offset, request, length)
+    except OffsetMismatch as e:
+        return JsonResponse({'status': 'error', 'message': str(e), 'offset': e.offset}, status=e.status)
+    except UploadError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=e.status)
+    return JsonResponse({'status': 'success', **_upload_state(upload)})
@@ -181,3 +181,50 @@ MARKDOWNX_UPLOAD_CONTENT_TYPES = ['image/jpeg', 'image/png', 'image/svg+xml']
 MARKDOWNX_IMAGE_MAX_SIZE = {'size': (500, 500), 'quality': 90}
 MARKDOWNX_UPLOAD_URLS_PATH = '/markdownx/upload/'
 MARKDOWNX_UPLOAD_MAX_SIZE = 50 * 1024 * 1024  # 50MB
+
+# Resources API
+# 'model' uses ResourceSerializer, 'fast' builds the payload from values_list() rows.
+# Can be overridden per request with ?serializer=model|fast
+RESOURCE_API_SERIALIZER = os.getenv('RESOURCE_API_SERIALIZER', 'model')
+
+# Blog view counter
+# Post views are buffered in memory and written as batched UPDATEs every
+# BLOG_VIEW_COUNT_FLUSH_INTERVAL seconds or after BLOG_VIEW_COUNT_MAX_PENDING views
+BLOG_VIEW_COUNT_FLUSH_INTERVAL = 10
+BLOG_VIEW_COUNT_MAX_PENDING = 1000
+
+# Blog search
+# Dotted path to a blog.search backend class. None picks one from the database:
+# MySQL FULLTEXT, SQLite FTS5, or plain icontains as a fallback.
+# 'blog.search_index.BM25SearchBackend' uses the pure-Python index file below instead
+BLOG_SEARCH_BACKEND = os.getenv('BLOG_SEARCH_BACKEND') or None
+BLOG_SEARCH_INDEX_PATH = BASE_DIR / 'blog_search.idx'
+# BM25 backend: incremental updates are merged into the index once their log exceeds this
+BLOG_SEARCH_DELTA_MAX_BYTES = 4 * 1024 * 1024
+
+# Backstop TTL for cached blog home fragments; signals invalidate them on change
+BLOG_HOME_CACHE_TIMEOUT = 60 * 15
+
+# Tag popularity score = posts * POST_WEIGHT + log(1 + views) * VIEW_WEIGHT
+BLOG_TAG_POPULARITY_POST_WEIGHT = 1.0
+BLOG_TAG_POPULARITY_VIEW_WEIGHT = 0.5
+
+# Number of precomputed related posts stored per blog post
+BLOG_RELATED_POSTS_COUNT = 6
+
+# Live notifications (Server-Sent Events, served under ASGI)
+# The default broker fans out within one process; point this at a shared broker for several workers
+NOTIFICATION_BROKER = 'base.pubsub.LocalBroker'
+NOTIFICATION_STREAM_MAX_SECONDS = 300
+
+# Notification retention: archive_notifications moves older rows to the archive table
+NOTIFICATION_RETENTION_DAYS = 90
+# Notifications sharing a group within this window collapse into one summary
+NOTIFICATION_BURST_WINDOW_MINUTES = 30
+
+# Chunked, resumable resource uploads
+RESOURCE_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # bytes per request, also the memory bound per upload
+RESOURCE_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024  # 2GB, for lecture videos
+RESOURCE_UPLOAD_STAGING_DIR = BASE_DIR / 'upload_staging'  # outside MEDIA_ROOT, never served
+# Resource.file storage; identical uploads share one stored file
+RESOURCE_FILE_STORAGE = 'resource.storage.ContentAddressedStorage'
@@ -19,32 +19,77 @@ document.addEventListener("DOMContentLoaded", function () {
   // Store the API data globally for search functionality
   let allPapers = [];
 
-  // Fetch data from API
-  const url = "/api/resources/";
-  fetch(url)
-    .then((res) => res.json())
-    .then((data) => {
-      allPapers = data.data;
-      console.log("Loaded papers:", allPapers);
-
-      // Display all papers initially
-      displayPapers(allPapers);
-    })
-    .catch((err) => {
-      console.log("Error fetching data:", err);
-      noResults.style.display = "block";
-      noResults.textContent = "Error loading papers. Please try again later.";
-    });
+  // Resources are fetched page by page; nextCursor points at the next page
+  const PAGE_SIZE = 24;
+  let currentQuery = "";
+  let nextCursor = null;
+  // Controller of the request in flight, if any
+  let inFlight = null;
+
+  const loadMoreBtn = document.createElement("button");
+  loadMoreBtn.className = "search-btn";
+  loadMoreBtn.textContent = "Load More";
+  const loadMoreWrapper = document.createElement("div");
+  loadMoreWrapper.className = "col-12 text-center mb-4";
+  loadMoreWrapper.style.display = "none";
+  loadMoreWrapper.appendChild(loadMoreBtn);
+  paperResults.parentNode.appendChild(loadMoreWrapper);
+
+  // Fetch one page of resources from the API. A new search supersedes
+  // whatever is loading; an extra "Load More" click while loading is ignored.
+  function loadPapers(query, append) {
+    if (inFlight) {
+      if (append) return;
+      inFlight.abort();
+    }
+    const controller = new AbortController();
+    inFlight = controller;
+
+    let url = `/api/resources/?page_size=${PAGE_SIZE}`;
+    if (query) url += `&${query}`;
+    if (append && nextCursor) url += `&cursor=${encodeURIComponent(nextCursor)}`;
+
+    fetch(url, { signal: controller.signal })
+      .then((res) => res.json())
+      .then((data) => {
+        const papers = data.data || [];
+        allPapers = append ? allPapers.concat(papers) : papers;
+        nextCursor = data.next;
+        console.log("Loaded papers:", allPapers.length);
+
+        displayPapers(papers, append);
+        loadMoreWrapper.style.display = nextCursor ? "block" : "none";
+      })
+      .catch((err) => {
+        // Superseded by a newer search
+        if (err.name === "AbortError") return;
+        console.log("Error fetching data:", err);
+        noResults.style.display = "block";
+        noResults.textContent = "Error loading papers. Please try again later.";
+      })
+      .finally(() => {
+        if (inFlight === controller) inFlight = null;
+      });
+  }
+
+  loadMoreBtn.addEventListener("click", function () {
+    loadPapers(currentQuery, true);
+  });
+
+  // Display the first page initially
+  loadPapers(currentQuery, false);
 
   // Function to display papers
-  function displayPapers(papers) {
+  function displayPapers(papers, append) {
     if (papers && papers.length > 0) {
       // Hide the no results message
       noResults.style.display = "none";
       // Show the results container
       paperResults.style.display = "flex";
-      // Clear any existing results
-      paperResults.innerHTML = "";
+      // Clear any existing results unless we are appending a new page
+      if (!append) {
+        paperResults.innerHTML = "";
+      }
 
       papers.forEach((paper) => {
         const paperCard = document.createElement("div");
@@ -106,7 +151,7 @@ document.addEventListener("DOMContentLoaded", function () {
 
         paperResults.appendChild(paperCard);
       });
-    } else {
+    } else if (!append) {
       // If no data, show the no results message
       noResults.style.display = "block";
       noResults.textContent = "No papers found matching your criteria.";
@@ -122,21 +167,9 @@ document.addEventListener("DOMContentLoaded", function () {
     const semester = semesterInput.value;
     console.log("Search criteria:", course, session, subject, semester);
 
-    const url_ = `/api/resources/?course=${course}&session=${session}&semester=${semester}&subject=${subject}`;
-    fetch(url_, {
-      method: "GET",
-      headers: {
-        "Content-Type": "application/json",
-      },
-    })
-      .then((res) => res.json())
-      .then((data) => {
-        console.log(data);
-        displayPapers(data.data);
-      })
-      .catch((err) => {
-        console.log(err);
-      });
+    currentQuery = `course=${course}&session=${session}&semester=${semester}&subject=${subject}`;
+    nextCursor = null;
+    loadPapers(currentQuery, false);
   });
 
   // Add hover effects to buttons and cards